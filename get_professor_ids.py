@@ -8,6 +8,242 @@ import csv
 import json
 from datetime import datetime
 import os
+import sys
+import contextlib
+import urllib.parse
+import argparse
+import asyncio
+import time
+import threading
+import email.utils
+import http.server
+import random
+import shutil
+import sqlite3
+import gzip
+import io
+import hashlib
+import heapq
+import statistics
+import struct
+import mmap
+import unicodedata
+import tempfile
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError, SSLError
+
+try:
+    import httpx
+except ImportError:
+    httpx = None  # Only needed for the async engine
+
+try:
+    import ijson
+except ImportError:
+    ijson = None  # Without it professors.all is parsed in one go
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # Compressed tracking files fall back to gzip
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Department statistics fall back to pure Python
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None  # Only needed for the optional Parquet output
+
+try:
+    import brotli  # noqa: F401 - lets urllib3/httpx decode br responses
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+# Number of professors.get requests kept in flight while fetching detailed reviews
+DEFAULT_MAX_WORKERS = 8
+
+# PolyRatings tRPC endpoints
+PROFESSORS_ALL_URL = "https://api-prod.polyratings.org/professors.all"
+PROFESSORS_GET_URL = "https://api-prod.polyratings.org/professors.get?input=%7B%22id%22%3A%22{professor_id}%22%7D"
+PROFESSORS_GET_BATCH_URL = "https://api-prod.polyratings.org/professors.get?batch=1&input={batch_input}"
+
+# Number of professors fetched per professors.get round trip (1 disables tRPC batching)
+DEFAULT_BATCH_SIZE = 1
+
+# Request rate limits, to be respectful to the API. The default is only a
+# ceiling: the worker count bounds the real rate and 429/503 responses slow
+# everyone down from there
+DEFAULT_REQUESTS_PER_SECOND = 100.0
+DEFAULT_BURST = 20
+MIN_REQUESTS_PER_SECOND = 0.5
+
+# Statuses that mean the server wants us to slow down
+THROTTLE_STATUSES = {429, 503}
+
+# Retry policy for transient failures
+DEFAULT_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+# Professors allowed to fail (after retries) before the run is considered failed
+DEFAULT_ERROR_BUDGET = 25
+
+# Professor fields that, when unchanged since the last snapshot, mean their reviews are unchanged too
+REFRESH_FIELDS = ['numEvals', 'overallRating', 'materialClear', 'studentDifficulties']
+
+# Checkpoint of completed professors, so an interrupted detailed-review run can resume
+DEFAULT_CHECKPOINT_FILENAME = "data/tracking/professor_detailed_reviews.checkpoint.jsonl"
+
+# Checkpoints older than this are from a previous day's run and are discarded
+CHECKPOINT_MAX_AGE_HOURS = 12
+
+# File suffixes of the supported tracking file compressions
+COMPRESSION_SUFFIXES = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+
+# Full-text index over review text, updated in place each run
+DEFAULT_SEARCH_INDEX_FILENAME = "data/main/review_search.db"
+
+# Delta snapshot store; a new base is written after this many deltas to bound replay cost
+DEFAULT_SNAPSHOT_DIR = "data/tracking/snapshots"
+MAX_DELTA_CHAIN = 30
+
+# Canonical review order, and how many rows are sorted in memory before spilling a run to disk
+REVIEW_SORT_FIELDS = ['professor_id', 'course_code', 'post_date', 'review_id']
+DEFAULT_SORT_CHUNK_ROWS = 200000
+
+# Per-department review shards, so a new review only rewrites one small file.
+# With --shard-reviews they replace the monolithic reviews CSV in data/main
+REVIEW_SHARD_DIR = "data/main/reviews_by_department"
+SHARDED_MAIN_FILES = {"data/main/professor_detailed_reviews.csv": REVIEW_SHARD_DIR}
+
+# Review columns stored dictionary-encoded in Parquet (few distinct, often repeated values)
+PARQUET_DICTIONARY_COLUMNS = ['professor_department', 'course_code', 'grade', 'grade_level', 'course_type']
+PARQUET_FLOAT_COLUMNS = ['overall_rating', 'presents_material_clearly', 'recognizes_student_difficulties']
+
+# Shared HTTP session so every request reuses pooled keep-alive connections
+_http_session = None
+_http_session_lock = threading.Lock()
+
+# Shared rate limiter and retry policy used by every fetch path
+_rate_limiter = None
+_retry_policy = None
+
+# SHA-256 of the uncompressed content of each output written this run, by filename
+_output_digests = {}
+
+# CSV headers for full professor data
+PROFESSOR_HEADERS = [
+    'id',
+    'firstName',
+    'lastName',
+    'fullName',
+    'department',
+    'numEvals',
+    'overallRating',
+    'materialClear',
+    'studentDifficulties',
+    'courses',
+    'tags',
+    'courses_count',
+    'tags_count'
+]
+
+# CSV headers for the name-to-ID mapping
+NAME_TO_ID_HEADERS = ['fullName', 'firstName', 'lastName', 'id', 'department', 'overallRating', 'numEvals']
+
+# CSV headers for detailed reviews
+REVIEW_HEADERS = [
+    'professor_id',
+    'professor_name',
+    'professor_department',
+    'course_code',
+    'review_id',
+    'grade',
+    'grade_level',
+    'course_type',
+    'overall_rating',
+    'presents_material_clearly',
+    'recognizes_student_difficulties',
+    'rating_text',
+    'post_date'
+]
+
+class CompactRecord(Mapping):
+    """Read-mostly mapping kept in __slots__ instead of a per-row dict
+    
+    Subclasses list their fields; everything in `interned` is passed through
+    sys.intern, so a value repeated across thousands of rows (department,
+    course code, grade, professor ID, ...) is stored once. Records behave like
+    the dicts they replace (csv.DictWriter, record['id'], .get(), dict(record)).
+    """
+    
+    __slots__ = ()
+    fields = ()
+    _field_set = frozenset()
+    interned = frozenset()
+    
+    def __init__(self, **values):
+        for field in self.fields:
+            value = values.get(field, '')
+            if field in self.interned and type(value) is str:
+                value = sys.intern(value)
+            setattr(self, field, value)
+    
+    @classmethod
+    def from_mapping(cls, mapping):
+        return cls(**{field: mapping.get(field, '') for field in cls.fields})
+    
+    def __getitem__(self, key):
+        if key not in self._field_set:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __setitem__(self, key, value):
+        if key not in self._field_set:
+            raise KeyError(key)
+        setattr(self, key, value)
+    
+    def __iter__(self):
+        return iter(self.fields)
+    
+    def __len__(self):
+        return len(self.fields)
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+class Professor(CompactRecord):
+    """Normalized professor record (PROFESSOR_HEADERS)"""
+    
+    __slots__ = tuple(PROFESSOR_HEADERS)
+    fields = tuple(PROFESSOR_HEADERS)
+    _field_set = frozenset(PROFESSOR_HEADERS)
+    interned = frozenset(['department'])
+
+class Review(CompactRecord):
+    """One detailed review row (REVIEW_HEADERS)
+    
+    Only review_id and rating_text are unique per review; every other column
+    repeats across rows and is interned. Loading the ~57k review history this
+    way takes about 260 bytes per review on top of the review text, against
+    about 1,150 for a dict per row (measured with tracemalloc on CPython 3.11);
+    keep it under 300.
+    """
+    
+    __slots__ = tuple(REVIEW_HEADERS)
+    fields = tuple(REVIEW_HEADERS)
+    _field_set = frozenset(REVIEW_HEADERS)
+    interned = frozenset(field for field in REVIEW_HEADERS if field not in ('review_id', 'rating_text'))
 
 def create_data_directories():
     """Create necessary directories for organizing data"""
@@ -24,17 +260,342 @@ def create_data_directories():
     
     return directories
 
-def fetch_professor_data():
-    """Fetch professor data from the PolyRatings API"""
-    api_url = "https://api-prod.polyratings.org/professors.all"
+def resolve_compression(compression):
+    """Turn 'auto' into zstd when zstandard is installed, gzip otherwise"""
+    if compression == 'auto':
+        return 'zstd' if zstandard is not None else 'gzip'
+    if compression == 'zstd' and zstandard is None:
+        print("⚠️  zstandard is not installed, compressing tracking files with gzip")
+        return 'gzip'
+    return compression
+
+def _compression_of(filename):
+    """Compression implied by a file's suffix"""
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if suffix and filename.endswith(suffix):
+            return compression
+    return 'none'
+
+class HashingTextWriter:
+    """Text file wrapper that hashes everything written, recording the digest on close"""
+    
+    def __init__(self, file, filename):
+        self._file = file
+        self.filename = filename
+        self._digest = hashlib.sha256()
+    
+    def write(self, text):
+        self._digest.update(text.encode('utf-8'))
+        return self._file.write(text)
+    
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+            _output_digests[self.filename] = self._digest.hexdigest()
+    
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _open_text_output(filename):
+    compression = _compression_of(filename)
+    if compression == 'gzip':
+        return gzip.open(filename, 'wt', newline='', encoding='utf-8', compresslevel=6)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd files require zstandard (pip install zstandard)")
+        raw_file = open(filename, 'wb')
+        stream = zstandard.ZstdCompressor(level=10).stream_writer(raw_file, closefd=True)
+        return io.TextIOWrapper(stream, newline='', encoding='utf-8')
+    return open(filename, 'w', newline='', encoding='utf-8')
+
+def open_text_output(filename):
+    """Open a text file for CSV writing, compressing it if the name ends in .gz or .zst
+    
+    The content is hashed as it is written so promotion can tell whether it
+    differs from the current main file without reading it back.
+    """
+    return HashingTextWriter(_open_text_output(filename), filename)
+
+def open_text_input(filename):
+    """Open a (possibly .gz/.zst compressed) text file for CSV reading, decompressing as it streams"""
+    compression = _compression_of(filename)
+    if compression == 'gzip':
+        return gzip.open(filename, 'rt', newline='', encoding='utf-8')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd files require zstandard (pip install zstandard)")
+        raw_file = open(filename, 'rb')
+        stream = zstandard.ZstdDecompressor().stream_reader(raw_file, closefd=True)
+        return io.TextIOWrapper(stream, newline='', encoding='utf-8')
+    return open(filename, newline='', encoding='utf-8')
+
+def configure_http_session(pool_size=DEFAULT_MAX_WORKERS):
+    """(Re)create the shared HTTP session with a connection pool sized for pool_size concurrent requests"""
+    global _http_session
+    
+    session = requests.Session()
+    session.headers.update({'Accept-Encoding': ACCEPT_ENCODING})
+    
+    # Requests beyond the pool size wait for a free connection instead of
+    # opening (and then discarding) extra ones
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size), pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    
+    with _http_session_lock:
+        old_session, _http_session = _http_session, session
+    if old_session is not None:
+        old_session.close()
+    
+    return session
+
+def get_http_session():
+    """Return the shared HTTP session, creating it with the default pool size if needed"""
+    with _http_session_lock:
+        session = _http_session
+    return session if session is not None else configure_http_session()
+
+def close_http_session():
+    """Close the shared HTTP session and its pooled connections"""
+    global _http_session
+    with _http_session_lock:
+        session, _http_session = _http_session, None
+    if session is not None:
+        session.close()
+
+def create_async_client(concurrency=DEFAULT_MAX_WORKERS):
+    """Create an httpx client whose keep-alive pool matches the async engine's concurrency"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    return httpx.AsyncClient(limits=limits, headers={'Accept-Encoding': ACCEPT_ENCODING})
+
+class RateLimiter:
+    """Thread-safe token bucket that backs off when the API pushes back
+    
+    Tokens refill at the current rate up to burst. A 429/503 halves the rate
+    and pauses all callers for Retry-After (if given); every success ramps the
+    rate back up towards the configured maximum.
+    """
+    
+    def __init__(self, rate=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_BURST, min_rate=MIN_REQUESTS_PER_SECOND):
+        self.max_rate = max(rate, min_rate)
+        self.min_rate = min_rate
+        self.rate = self.max_rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+    
+    def _reserve(self):
+        """Take a token and return how long the caller has to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+            self.updated = max(now, self.updated)
+            self.tokens -= 1
+            
+            wait = max(0.0, self.blocked_until - now)
+            if self.tokens < 0:
+                wait = max(wait, -self.tokens / self.rate)
+            return wait
+    
+    def acquire(self):
+        """Block the calling thread until a request may be sent"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
     
+    async def acquire_async(self):
+        """Wait on the event loop until a request may be sent"""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+    
+    def on_success(self):
+        """Ramp the rate back up after a successful request"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+    
+    def on_throttle(self, retry_after=None):
+        """Halve the rate and pause everyone for retry_after seconds (or one request interval)"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            pause = retry_after if retry_after is not None else 1 / self.rate
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+            
+            # Don't let a burst of saved-up tokens fire as soon as the pause ends
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = self.blocked_until
+        print(f"⚠️  API asked us to slow down, now at {self.rate:.1f} requests/sec")
+
+def configure_rate_limiter(rate=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_BURST):
+    """Replace the shared rate limiter"""
+    global _rate_limiter
+    _rate_limiter = RateLimiter(rate, burst)
+    return _rate_limiter
+
+def get_rate_limiter():
+    """Return the shared rate limiter, creating it with the default limits if needed"""
+    return _rate_limiter if _rate_limiter is not None else configure_rate_limiter()
+
+def _parse_retry_after(value):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds, or None"""
+    if not value:
+        return None
     try:
-        print("🔄 Fetching professor data from API...")
-        response = requests.get(api_url, timeout=30)
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _report_response(limiter, response):
+    """Tell the rate limiter whether the server accepted or throttled a request"""
+    if response.status_code in THROTTLE_STATUSES:
+        limiter.on_throttle(_parse_retry_after(response.headers.get('Retry-After')))
+    else:
+        limiter.on_success()
+
+class RetryPolicy:
+    """How often and how long to retry a request that failed transiently"""
+    
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY, retryable_statuses=RETRYABLE_STATUSES):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable_statuses = set(retryable_statuses)
+    
+    def delay(self, attempt, retry_after=None):
+        """Exponential backoff with full jitter, never shorter than the server's Retry-After"""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        return max(backoff, retry_after or 0.0)
+
+def configure_retry_policy(max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Replace the shared retry policy"""
+    global _retry_policy
+    _retry_policy = RetryPolicy(max_attempts)
+    return _retry_policy
+
+def get_retry_policy():
+    """Return the shared retry policy, creating it with the defaults if needed"""
+    return _retry_policy if _retry_policy is not None else configure_retry_policy()
+
+# Network errors worth retrying (as opposed to e.g. an invalid URL)
+RETRYABLE_EXCEPTIONS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+def api_get(api_url, timeout=30, stream=False):
+    """GET an API URL through the shared session, rate limited and retried on transient failures
+    
+    Retryable statuses are returned as-is once attempts run out, so callers
+    still see the final error through raise_for_status().
+    """
+    limiter = get_rate_limiter()
+    policy = get_retry_policy()
+    
+    for attempt in range(policy.max_attempts):
+        last_attempt = attempt == policy.max_attempts - 1
+        limiter.acquire()
+        try:
+            response = get_http_session().get(api_url, timeout=timeout, stream=stream)
+        except RETRYABLE_EXCEPTIONS as e:
+            if last_attempt:
+                raise
+            delay = policy.delay(attempt)
+            print(f"🔁 Retrying in {delay:.1f}s after error: {e}")
+            time.sleep(delay)
+            continue
+        
+        _report_response(limiter, response)
+        if response.status_code not in policy.retryable_statuses or last_attempt:
+            return response
+        
+        delay = policy.delay(attempt, _parse_retry_after(response.headers.get('Retry-After')))
+        print(f"🔁 Retrying in {delay:.1f}s after HTTP {response.status_code}")
+        response.close()
+        time.sleep(delay)
+
+async def api_get_async(client, api_url, timeout=30):
+    """Async counterpart of api_get using an httpx client"""
+    limiter = get_rate_limiter()
+    policy = get_retry_policy()
+    
+    for attempt in range(policy.max_attempts):
+        last_attempt = attempt == policy.max_attempts - 1
+        await limiter.acquire_async()
+        try:
+            response = await client.get(api_url, timeout=timeout)
+        except httpx.TransportError as e:
+            if last_attempt:
+                raise
+            delay = policy.delay(attempt)
+            print(f"🔁 Retrying in {delay:.1f}s after error: {e!r}")
+            await asyncio.sleep(delay)
+            continue
+        
+        _report_response(limiter, response)
+        if response.status_code not in policy.retryable_statuses or last_attempt:
+            return response
+        
+        delay = policy.delay(attempt, _parse_retry_after(response.headers.get('Retry-After')))
+        print(f"🔁 Retrying in {delay:.1f}s after HTTP {response.status_code}")
+        await asyncio.sleep(delay)
+
+# Errors raised while decoding the professors.all payload
+JSON_ERRORS = (json.JSONDecodeError,) + ((ijson.JSONError,) if ijson is not None else ())
+
+@contextlib.contextmanager
+def _raw_stream_errors():
+    """Raise urllib3 errors from reading response.raw as the requests errors iter_content would"""
+    try:
+        yield
+    except ProtocolError as e:
+        raise requests.exceptions.ChunkedEncodingError(e)
+    except DecodeError as e:
+        raise requests.exceptions.ContentDecodingError(e)
+    except ReadTimeoutError as e:
+        raise requests.exceptions.ConnectionError(e)
+    except SSLError as e:
+        raise requests.exceptions.SSLError(e)
+
+def iter_professor_data():
+    """Yield professor dicts from the PolyRatings API as the response streams in
+    
+    With ijson installed, items of result.data are parsed incrementally from
+    the response body, so memory stays flat and callers can start writing
+    before the download finishes. Without it the payload is parsed in one go.
+    Raises requests/JSON errors like fetch_professor_data would print them.
+    """
+    response = api_get(PROFESSORS_ALL_URL, stream=True)
+    with response:
         response.raise_for_status()
         
-        data = response.json()
-        professors = data.get('result', {}).get('data', [])
+        if ijson is None:
+            yield from response.json().get('result', {}).get('data', [])
+            return
+        
+        # Let urllib3 undo gzip/brotli before ijson reads the raw stream
+        response.raw.decode_content = True
+        with _raw_stream_errors():
+            yield from ijson.items(response.raw, 'result.data.item', use_float=True)
+
+def fetch_professor_data():
+    """Fetch professor data from the PolyRatings API"""
+    try:
+        print("🔄 Fetching professor data from API...")
+        professors = list(iter_professor_data())
         
         print(f"✅ Successfully fetched {len(professors)} professors")
         return professors
@@ -42,121 +603,61 @@ def fetch_professor_data():
     except requests.exceptions.RequestException as e:
         print(f"❌ Error fetching data: {e}")
         return None
-    except json.JSONDecodeError as e:
+    except JSON_ERRORS as e:
         print(f"❌ Error parsing JSON: {e}")
         return None
 
-def save_to_csv(professors, filename="professors_data.csv"):
-    """Save professor data to CSV file (overwrites existing file)"""
+def normalize_professor(prof):
+    """Flatten an API professor dict once into the record every output sink shares"""
+    # Process courses list
+    courses = prof.get('courses', [])
+    
+    # Process tags
+    tags = prof.get('tags', {})
+    
+    return Professor(
+        id=prof.get('id', ''),
+        firstName=prof.get('firstName', ''),
+        lastName=prof.get('lastName', ''),
+        fullName=f"{prof.get('firstName', '')} {prof.get('lastName', '')}".strip(),
+        department=prof.get('department', ''),
+        numEvals=prof.get('numEvals', 0),
+        overallRating=prof.get('overallRating', 0),
+        materialClear=prof.get('materialClear', 0),
+        studentDifficulties=prof.get('studentDifficulties', 0),
+        courses='; '.join(courses) if courses else '',
+        tags='; '.join([f"{k}:{v}" for k, v in tags.items()]) if tags else '',
+        courses_count=len(courses),
+        tags_count=len(tags)
+    )
+
+def save_to_csv(professors, filename="professors_data.csv", sort_rows=False):
+    """Save professor data to CSV file (overwrites existing file), optionally ordered by ID"""
     if not professors:
         print("❌ No professor data to save")
         return False
     
-    # Define CSV headers
-    headers = [
-        'id',
-        'firstName', 
-        'lastName',
-        'fullName',
-        'department',
-        'numEvals',
-        'overallRating',
-        'materialClear',
-        'studentDifficulties',
-        'courses',
-        'tags',
-        'courses_count',
-        'tags_count'
-    ]
-    
-    try:
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=headers)
-            writer.writeheader()
-            
-            for prof in professors:
-                # Create full name
-                full_name = f"{prof.get('firstName', '')} {prof.get('lastName', '')}".strip()
-                
-                # Process courses list
-                courses = prof.get('courses', [])
-                courses_str = '; '.join(courses) if courses else ''
-                courses_count = len(courses)
-                
-                # Process tags
-                tags = prof.get('tags', {})
-                tags_str = '; '.join([f"{k}:{v}" for k, v in tags.items()]) if tags else ''
-                tags_count = len(tags)
-                
-                # Create row data
-                row = {
-                    'id': prof.get('id', ''),
-                    'firstName': prof.get('firstName', ''),
-                    'lastName': prof.get('lastName', ''),
-                    'fullName': full_name,
-                    'department': prof.get('department', ''),
-                    'numEvals': prof.get('numEvals', 0),
-                    'overallRating': prof.get('overallRating', 0),
-                    'materialClear': prof.get('materialClear', 0),
-                    'studentDifficulties': prof.get('studentDifficulties', 0),
-                    'courses': courses_str,
-                    'tags': tags_str,
-                    'courses_count': courses_count,
-                    'tags_count': tags_count
-                }
-                
-                writer.writerow(row)
-        
-        print(f"✅ Data saved to {filename}")
-        print(f"📊 Total professors: {len(professors)}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error saving to CSV: {e}")
-        return False
+    return run_pipeline(professors, [ProfessorsCsvSink(filename, sort_rows)])
 
-def save_name_to_id_mapping(professors, filename="professor_name_to_id.csv"):
-    """Save a simplified mapping of professor names to IDs (overwrites existing file)"""
+def save_name_to_id_mapping(professors, filename="professor_name_to_id.csv", sort_rows=False):
+    """Save a simplified mapping of professor names to IDs (overwrites existing file), optionally ordered by ID"""
     if not professors:
         print("❌ No professor data to save")
         return False
     
-    try:
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['fullName', 'firstName', 'lastName', 'id', 'department', 'overallRating', 'numEvals'])
-            
-            for prof in professors:
-                full_name = f"{prof.get('firstName', '')} {prof.get('lastName', '')}".strip()
-                writer.writerow([
-                    full_name,
-                    prof.get('firstName', ''),
-                    prof.get('lastName', ''),
-                    prof.get('id', ''),
-                    prof.get('department', ''),
-                    prof.get('overallRating', 0),
-                    prof.get('numEvals', 0)
-                ])
-        
-        print(f"✅ Name-to-ID mapping saved to {filename}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error saving name mapping: {e}")
-        return False
+    return run_pipeline(professors, [NameToIdSink(filename, sort_rows)])
+
+def _professor_detail_from_response(response):
+    """Pull the professor data out of a professors.get response (shared by both engines)"""
+    response.raise_for_status()
+    return response.json().get('result', {}).get('data', {})
 
 def fetch_detailed_professor_data(professor_id):
     """Fetch detailed professor data including reviews from the PolyRatings API"""
-    api_url = f"https://api-prod.polyratings.org/professors.get?input=%7B%22id%22%3A%22{professor_id}%22%7D"
+    api_url = PROFESSORS_GET_URL.format(professor_id=professor_id)
     
     try:
-        response = requests.get(api_url, timeout=30)
-        response.raise_for_status()
-        
-        data = response.json()
-        professor_data = data.get('result', {}).get('data', {})
-        
-        return professor_data
+        return _professor_detail_from_response(api_get(api_url))
         
     except requests.exceptions.RequestException as e:
         print(f"❌ Error fetching detailed data for professor {professor_id}: {e}")
@@ -165,229 +666,2710 @@ def fetch_detailed_professor_data(professor_id):
         print(f"❌ Error parsing JSON for professor {professor_id}: {e}")
         return None
 
-def save_detailed_professor_reviews(professors, main_filename="data/main/professor_detailed_reviews.csv", tracking_filename=None):
-    """Save detailed professor reviews to CSV files (tracking first, then main for safety)"""
-    if not professors:
-        print("❌ No professor data to save")
-        return False
+def _build_batch_url(professor_ids):
+    """Build a tRPC batch URL with one professors.get input per professor ID"""
+    batch_input = json.dumps({str(i): {'id': professor_id} for i, professor_id in enumerate(professor_ids)})
+    return PROFESSORS_GET_BATCH_URL.format(batch_input=urllib.parse.quote(batch_input))
+
+def _split_batch_results(professor_ids, data):
+    """Split a tRPC batch response into per-professor data (None for items that failed)"""
+    if not isinstance(data, list) or len(data) != len(professor_ids):
+        raise ValueError(f"expected {len(professor_ids)} batch results, got {type(data).__name__}")
     
-    # Define CSV headers for detailed reviews
-    headers = [
-        'professor_id',
-        'professor_name',
-        'professor_department',
-        'course_code',
-        'review_id',
-        'grade',
-        'grade_level',
-        'course_type',
-        'overall_rating',
-        'presents_material_clearly',
-        'recognizes_student_difficulties',
-        'rating_text',
-        'post_date'
-    ]
+    results = []
+    for professor_id, item in zip(professor_ids, data):
+        if not isinstance(item, dict) or 'error' in item:
+            error = item.get('error') if isinstance(item, dict) else item
+            if isinstance(error, dict):
+                error = error.get('message', error)
+            print(f"❌ Error fetching detailed data for professor {professor_id}: {error}")
+            results.append(None)
+        else:
+            results.append(item.get('result', {}).get('data', {}))
     
-    # First, save to tracking file
-    tracking_success = False
-    if tracking_filename:
-        try:
-            print(f"🔄 Saving to tracking file: {tracking_filename}")
-            with open(tracking_filename, 'w', newline='', encoding='utf-8') as tracking_file:
-                tracking_writer = csv.DictWriter(tracking_file, fieldnames=headers)
-                tracking_writer.writeheader()
-                
-                total_reviews = 0
-                
-                for prof in professors:
-                    prof_id = prof.get('id', '')
-                    prof_name = f"{prof.get('firstName', '')} {prof.get('lastName', '')}".strip()
-                    prof_dept = prof.get('department', '')
-                    
-                    print(f"🔄 Fetching detailed data for {prof_name}...")
-                    
-                    # Fetch detailed data for this professor
-                    detailed_data = fetch_detailed_professor_data(prof_id)
-                    
-                    if detailed_data and 'reviews' in detailed_data:
-                        reviews = detailed_data.get('reviews', {})
-                        
-                        # Process reviews for each course
-                        for course_code, course_reviews in reviews.items():
-                            if isinstance(course_reviews, list):
-                                for review in course_reviews:
-                                    # Create row data for each review
-                                    row = {
-                                        'professor_id': prof_id,
-                                        'professor_name': prof_name,
-                                        'professor_department': prof_dept,
-                                        'course_code': course_code,
-                                        'review_id': review.get('id', ''),
-                                        'grade': review.get('grade', ''),
-                                        'grade_level': review.get('gradeLevel', ''),
-                                        'course_type': review.get('courseType', ''),
-                                        'overall_rating': review.get('overallRating', 0),
-                                        'presents_material_clearly': review.get('presentsMaterialClearly', 0),
-                                        'recognizes_student_difficulties': review.get('recognizesStudentDifficulties', 0),
-                                        'rating_text': review.get('rating', ''),
-                                        'post_date': review.get('postDate', '')
-                                    }
-                                    
-                                    tracking_writer.writerow(row)
-                                    total_reviews += 1
-                    
-                    # Add a small delay to be respectful to the API
-                    import time
-                    time.sleep(0.1)
-                
-                print(f"✅ Tracking file saved successfully: {tracking_filename}")
-                print(f"📊 Total reviews collected: {total_reviews}")
-                tracking_success = True
-                
-        except Exception as e:
-            print(f"❌ Error saving to tracking file: {e}")
-            return False
+    return results
+
+def _batch_details_from_response(professor_ids, response):
+    """Split a professors.get batch response into per-professor data (shared by both engines)"""
+    # tRPC answers a partially failed batch with 207 (or an error status if
+    # every item failed) but still returns one result per input
+    data = response.json()
+    if not isinstance(data, list):
+        response.raise_for_status()
     
-    # Only update main file if tracking was successful
-    if tracking_success and main_filename:
-        try:
-            print(f"🔄 Copying tracking data to main file: {main_filename}")
-            import shutil
-            shutil.copy2(tracking_filename, main_filename)
-            print(f"✅ Main file updated successfully: {main_filename}")
-            return True
-        except Exception as e:
-            print(f"❌ Error copying to main file: {e}")
-            print("⚠️  Tracking file is safe, but main file update failed")
-            return False
+    return _split_batch_results(professor_ids, data)
+
+def fetch_detailed_professor_data_batch(professor_ids):
+    """Fetch detailed data for several professors in one tRPC batch request
     
-    return tracking_success
+    Returns a list aligned with professor_ids; entries are None for professors
+    whose item failed, so one bad ID doesn't fail the whole batch.
+    """
+    professor_ids = list(professor_ids)
+    api_url = _build_batch_url(professor_ids)
+    
+    try:
+        return _batch_details_from_response(professor_ids, api_get(api_url))
+        
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Error fetching detailed data for batch of {len(professor_ids)} professors: {e}")
+    except (json.JSONDecodeError, ValueError) as e:
+        print(f"❌ Error parsing JSON for batch of {len(professor_ids)} professors: {e}")
+    
+    return [None] * len(professor_ids)
 
-def save_department_summary(professors, filename="department_summary.csv"):
-    """Save department-level summary statistics (overwrites existing file)"""
-    if not professors:
-        print("❌ No professor data to save")
-        return False
+def _chunked(items, size):
+    """Yield lists of up to size items from any iterable"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _announce_batch(batch):
+    """Print a progress line for every professor in a batch about to be fetched"""
+    for prof in batch:
+        prof_name = f"{prof.get('firstName', '')} {prof.get('lastName', '')}".strip()
+        print(f"🔄 Fetching detailed data for {prof_name}...")
+
+def _fetch_detailed_professor_batch_worker(batch):
+    """Fetch detailed data for a batch of professors (runs inside a worker thread)"""
+    _announce_batch(batch)
     
-    # Group by department
-    dept_stats = {}
+    if len(batch) == 1:
+        results = [fetch_detailed_professor_data(batch[0].get('id', ''))]
+    else:
+        results = fetch_detailed_professor_data_batch([prof.get('id', '') for prof in batch])
     
-    for prof in professors:
-        dept = prof.get('department', 'Unknown')
-        if dept not in dept_stats:
-            dept_stats[dept] = {
-                'count': 0,
-                'total_rating': 0,
-                'total_evals': 0,
-                'professors': []
-            }
-        
-        dept_stats[dept]['count'] += 1
-        dept_stats[dept]['total_rating'] += prof.get('overallRating', 0)
-        dept_stats[dept]['total_evals'] += prof.get('numEvals', 0)
-        dept_stats[dept]['professors'].append(prof.get('id', ''))
+    return results
+
+def fetch_detailed_professor_data_concurrently(professors, max_workers=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield (professor, detailed_data) pairs in input order, keeping up to max_workers requests in flight"""
+    max_workers = max(1, max_workers)
     
-    try:
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['department', 'professor_count', 'avg_rating', 'total_evals', 'professor_ids'])
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        
+        for batch in _chunked(professors, max(1, batch_size)):
+            pending.append((batch, executor.submit(_fetch_detailed_professor_batch_worker, batch)))
             
-            for dept, stats in dept_stats.items():
-                avg_rating = stats['total_rating'] / stats['count'] if stats['count'] > 0 else 0
-                professor_ids = '; '.join(stats['professors'])
-                
-                writer.writerow([
-                    dept,
-                    stats['count'],
-                    round(avg_rating, 2),
-                    stats['total_evals'],
-                    professor_ids
-                ])
-        
-        print(f"✅ Department summary saved to {filename}")
-        return True
+            # Only queue a bounded number of requests ahead of the writer
+            if len(pending) >= max_workers * 2:
+                batch_done, future = pending.popleft()
+                yield from zip(batch_done, future.result())
         
-    except Exception as e:
-        print(f"❌ Error saving department summary: {e}")
-        return False
+        while pending:
+            batch_done, future = pending.popleft()
+            yield from zip(batch_done, future.result())
 
-def main():
-    """Main function to fetch and save professor data"""
-    print("🚀 PolyRatings Professor Data Fetcher")
-    print("=" * 50)
+def build_review_rows(prof, detailed_data):
+    """Build detailed review CSV rows for one professor from their professors.get data"""
+    rows = []
+    if not detailed_data or 'reviews' not in detailed_data:
+        return rows
     
-    # Create data directories
-    create_data_directories()
+    prof_id = prof.get('id', '')
+    prof_name = f"{prof.get('firstName', '')} {prof.get('lastName', '')}".strip()
+    prof_dept = prof.get('department', '')
+    reviews = detailed_data.get('reviews', {})
     
-    # Fetch data
-    professors = fetch_professor_data()
+    # Process reviews for each course
+    for course_code, course_reviews in reviews.items():
+        if isinstance(course_reviews, list):
+            for review in course_reviews:
+                # Create row data for each review
+                rows.append(Review(
+                    professor_id=prof_id,
+                    professor_name=prof_name,
+                    professor_department=prof_dept,
+                    course_code=course_code,
+                    review_id=review.get('id', ''),
+                    grade=review.get('grade', ''),
+                    grade_level=review.get('gradeLevel', ''),
+                    course_type=review.get('courseType', ''),
+                    overall_rating=review.get('overallRating', 0),
+                    presents_material_clearly=review.get('presentsMaterialClearly', 0),
+                    recognizes_student_difficulties=review.get('recognizesStudentDifficulties', 0),
+                    rating_text=review.get('rating', ''),
+                    post_date=review.get('postDate', '')
+                ))
     
-    if professors:
-        # Create timestamp for filenames
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return rows
+
+def load_previous_review_rows(professor_ids, filename="data/main/professor_detailed_reviews.csv"):
+    """Return {professor_id: review rows} from a previous reviews CSV for the given professors"""
+    previous_rows = {prof_id: [] for prof_id in professor_ids}
+    for row in _read_main_csv_rows(filename):
+        rows = previous_rows.get(row['professor_id'])
+        if rows is not None:
+            rows.append(Review.from_mapping(row))
+    
+    return previous_rows
+
+def load_cached_reviews(professors, previous_professors_filename="data/main/professors_data.csv", previous_reviews_filename="data/main/professor_detailed_reviews.csv"):
+    """Return {professor_id: review rows} for professors unchanged since the previous snapshot
+    
+    A professor is unchanged when their numEvals and rating aggregates match
+    the previous professors_data.csv. New or changed professors are left out,
+    so only they need a fresh professors.get call.
+    """
+    if not os.path.exists(previous_professors_filename) or not _main_csv_files(previous_reviews_filename):
+        print("⚠️  No previous snapshot found, fetching every professor")
+        return {}
+    
+    previous = {row['id']: row for row in _read_csv_rows(previous_professors_filename)}
+    
+    # The snapshot was written with str() of the API values, so compare the same way
+    cached_reviews = {}
+    for prof in professors:
+        prof_id = prof.get('id', '')
+        previous_row = previous.get(prof_id)
+        if previous_row is None:
+            continue
+        if all(str(prof.get(field, 0)) == previous_row.get(field) for field in REFRESH_FIELDS):
+            cached_reviews[prof_id] = []
+    
+    cached_reviews.update(load_previous_review_rows(cached_reviews, previous_reviews_filename))
+    
+    print(f"📊 {len(professors) - len(cached_reviews)} of {len(professors)} professors are new or changed")
+    return cached_reviews
+
+class ErrorBudgetExceeded(Exception):
+    """Raised when more professors failed to fetch than the run allows"""
+
+class ErrorBudget:
+    """Per-run count of professors whose fetch failed even after retries
+    
+    Failures within the budget keep that professor's previous reviews from
+    data/main instead of silently dropping them; one failure too many aborts
+    the run so the main files aren't updated with incomplete data. The
+    previous reviews of professor_ids (the ones being fetched) are read in a
+    single pass on the first failure and reused for every later one.
+    """
+    
+    def __init__(self, max_failures=DEFAULT_ERROR_BUDGET, previous_reviews_filename="data/main/professor_detailed_reviews.csv", professor_ids=()):
+        self.max_failures = max_failures
+        self.previous_reviews_filename = previous_reviews_filename
+        self.professor_ids = list(professor_ids)
+        self.failed = []
+        self._previous_rows = None
+    
+    def previous_rows(self, prof_id):
+        """Return the data/main review rows of one professor, loading them on first use"""
+        if self._previous_rows is None:
+            self._previous_rows = load_previous_review_rows(self.professor_ids, self.previous_reviews_filename)
+        return self._previous_rows.get(prof_id, [])
+    
+    def record_failure(self, prof):
+        """Count a failed professor and return the review rows to keep for them"""
+        prof_id = prof.get('id', '')
+        self.failed.append(prof_id)
+        if len(self.failed) > self.max_failures:
+            raise ErrorBudgetExceeded(f"{len(self.failed)} professors failed to fetch (budget: {self.max_failures})")
         
-        # Save timestamped files to tracking folder first (safe approach)
-        print("\n📁 Saving timestamped files to data/tracking/...")
-        tracking_success = True
+        rows = self.previous_rows(prof_id)
+        prof_name = f"{prof.get('firstName', '')} {prof.get('lastName', '')}".strip()
+        print(f"⚠️  Keeping {len(rows)} previous reviews for {prof_name} ({len(self.failed)}/{self.max_failures} failures allowed)")
+        return _cached_review_rows(prof, rows)
+
+class ReviewCheckpoint:
+    """Append-only JSON Lines log of professors whose reviews were already fetched
+    
+    The first line records when the run started; every following line holds one
+    professor ID and its review rows. Lines are flushed as they are written, so
+    whatever was fetched before a crash survives for the next run.
+    """
+    
+    def __init__(self, filename=DEFAULT_CHECKPOINT_FILENAME):
+        self.filename = filename
+        self.created = None
+        self._file = None
+        self._lock = threading.Lock()
+    
+    def load(self):
+        """Return {professor_id: review rows} from a recent checkpoint, or {} if there is none"""
+        if not os.path.exists(self.filename):
+            return {}
         
-        # Save basic data to tracking
-        if not save_to_csv(professors, f"data/tracking/professors_full_data_{timestamp}.csv"):
-            tracking_success = False
-        if not save_name_to_id_mapping(professors, f"data/tracking/professor_name_to_id_{timestamp}.csv"):
-            tracking_success = False
-        if not save_department_summary(professors, f"data/tracking/department_summary_{timestamp}.csv"):
-            tracking_success = False
+        completed = {}
+        try:
+            with open(self.filename, encoding='utf-8') as checkpoint_file:
+                header = json.loads(checkpoint_file.readline() or '{}')
+                created = datetime.fromisoformat(header.get('created', '1970-01-01T00:00:00'))
+                age_hours = (datetime.now() - created).total_seconds() / 3600
+                if age_hours > CHECKPOINT_MAX_AGE_HOURS:
+                    print(f"⚠️  Ignoring stale checkpoint from {created:%Y-%m-%d %H:%M}")
+                    return {}
+                
+                # A resumed run keeps the original start time, so repeated
+                # crashes can't keep an old checkpoint alive forever
+                self.created = created
+                
+                for line in checkpoint_file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # Last line was cut off by the crash
+                    completed[entry['id']] = [Review.from_mapping(row) for row in entry['rows']]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️  Could not read checkpoint {self.filename}: {e}")
+            self.created = None
+            return {}
         
-        # Fetch and save detailed professor reviews to tracking
-        print("\n📁 Fetching detailed professor reviews...")
-        print("⚠️  This may take a while as we fetch individual professor data...")
-        detailed_success = save_detailed_professor_reviews(
-            professors, 
-            main_filename=None,  # Don't update main yet
-            tracking_filename=f"data/tracking/professor_detailed_reviews_{timestamp}.csv"
-        )
+        print(f"♻️  Resuming from checkpoint: {len(completed)} professors already fetched")
+        return completed
+    
+    def open(self, completed=None):
+        """Start a fresh checkpoint file, carrying over already completed professors"""
+        if not completed or self.created is None:
+            self.created = datetime.now()
         
-        # Only update main files if tracking was successful
-        if tracking_success and detailed_success:
-            print("\n📁 Updating main files from successful tracking data...")
-            import shutil
-            
-            # Copy tracking files to main (safe copy operation)
-            try:
-                shutil.copy2(f"data/tracking/professors_full_data_{timestamp}.csv", "data/main/professors_data.csv")
-                shutil.copy2(f"data/tracking/professor_name_to_id_{timestamp}.csv", "data/main/professor_name_to_id.csv")
-                shutil.copy2(f"data/tracking/department_summary_{timestamp}.csv", "data/main/department_summary.csv")
-                shutil.copy2(f"data/tracking/professor_detailed_reviews_{timestamp}.csv", "data/main/professor_detailed_reviews.csv")
-                print("✅ All main files updated successfully from tracking data")
-            except Exception as e:
-                print(f"❌ Error copying tracking files to main: {e}")
-                print("⚠️  Tracking files are safe, but main files may be outdated")
+        temp_filename = f"{self.filename}.tmp"
+        with open(temp_filename, 'w', encoding='utf-8') as checkpoint_file:
+            checkpoint_file.write(json.dumps({'created': self.created.isoformat()}) + '\n')
+            for prof_id, rows in (completed or {}).items():
+                checkpoint_file.write(json.dumps({'id': prof_id, 'rows': rows}, default=dict) + '\n')
+        os.replace(temp_filename, self.filename)
+        
+        self._file = open(self.filename, 'a', encoding='utf-8')
+    
+    def record(self, prof_id, rows):
+        """Persist the review rows of one fetched professor"""
+        if self._file is None:
+            return
+        with self._lock:
+            self._file.write(json.dumps({'id': prof_id, 'rows': rows}, default=dict) + '\n')
+            self._file.flush()
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def clear(self):
+        """Remove the checkpoint once the tracking file was written successfully"""
+        self.close()
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+def _cached_review_rows(prof, rows):
+    """Refresh the professor name and department on cached review rows"""
+    prof_name = f"{prof.get('firstName', '')} {prof.get('lastName', '')}".strip()
+    prof_dept = prof.get('department', '')
+    for row in rows:
+        row['professor_name'] = prof_name
+        row['professor_department'] = prof_dept
+    return rows
+
+def _fetched_review_rows(prof, detailed_data, checkpoint=None, error_budget=None):
+    """Turn a professor's fetch result into review rows, checkpointing successes and budgeting failures"""
+    if detailed_data is None:
+        # Failed fetches aren't checkpointed, so a resumed run retries them
+        return error_budget.record_failure(prof) if error_budget is not None else []
+    
+    rows = build_review_rows(prof, detailed_data)
+    if checkpoint is not None:
+        checkpoint.record(prof.get('id', ''), rows)
+    return rows
+
+def _professors_to_fetch(professors, cached_reviews):
+    """Professors without cached rows, in input order"""
+    return [prof for prof in professors if prof.get('id', '') not in cached_reviews]
+
+def iter_professor_review_rows(professors, max_workers=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE, cached_reviews=None, checkpoint=None, error_budget=None):
+    """Yield (professor, review rows) in input order, only fetching professors without cached rows"""
+    cached_reviews = cached_reviews or {}
+    fetched = fetch_detailed_professor_data_concurrently(_professors_to_fetch(professors, cached_reviews), max_workers, batch_size)
+    
+    for prof in professors:
+        prof_id = prof.get('id', '')
+        if prof_id in cached_reviews:
+            yield prof, _cached_review_rows(prof, cached_reviews[prof_id])
         else:
-            print("⚠️  Skipping main file updates due to tracking failures")
-        
-        print("\n📁 Files created:")
-        print("  📂 data/main/")
-        print("    • professors_data.csv - Full professor data")
-        print("    • professor_name_to_id.csv - Name to ID mapping")
-        print("    • department_summary.csv - Department statistics")
-        print("    • professor_detailed_reviews.csv - Detailed student reviews")
-        print("  📂 data/tracking/")
-        print(f"    • professors_full_data_{timestamp}.csv")
-        print(f"    • professor_name_to_id_{timestamp}.csv")
-        print(f"    • department_summary_{timestamp}.csv")
-        print(f"    • professor_detailed_reviews_{timestamp}.csv")
-        
-        # Show some sample data
-        print(f"\n📊 Sample data (first 3 professors):")
-        for i, prof in enumerate(professors[:3]):
-            name = f"{prof.get('firstName', '')} {prof.get('lastName', '')}".strip()
-            dept = prof.get('department', '')
-            rating = prof.get('overallRating', 0)
-            evals = prof.get('numEvals', 0)
-            print(f"  {i+1}. {name} ({dept}) - Rating: {rating}, Evals: {evals}")
+            _, detailed_data = next(fetched)
+            yield prof, _fetched_review_rows(prof, detailed_data, checkpoint, error_budget)
+
+class ReviewOutput:
+    """Extra output fed the same review rows as the detailed reviews CSV
     
-    else:
-        print("❌ Failed to fetch professor data")
+    save_detailed_professor_reviews calls open() before the first professor,
+    write_rows(prof, rows) for every professor in order, then close() once
+    the CSV is complete, or abort() if it failed.
+    """
+    
+    def __init__(self, filename):
+        self.filename = filename
+    
+    def open(self):
+        pass
+    
+    def write_rows(self, prof, rows):
+        pass
+    
+    def close(self):
+        pass
+    
+    def abort(self):
+        if self.filename and os.path.exists(self.filename):
+            os.remove(self.filename)
 
-if __name__ == "__main__":
-    main()
+class ReviewParquetOutput(ReviewOutput):
+    """Columnar copy of the detailed reviews as Parquet, written in row groups
+    
+    Low-cardinality columns are dictionary-encoded and ratings are stored as
+    floats, so analytics reads can prune columns instead of parsing the CSV.
+    """
+    
+    def __init__(self, filename, row_group_size=50000):
+        super().__init__(filename)
+        self.row_group_size = row_group_size
+        self._writer = None
+    
+    @staticmethod
+    def schema():
+        fields = []
+        for column in REVIEW_HEADERS:
+            if column in PARQUET_DICTIONARY_COLUMNS:
+                fields.append(pa.field(column, pa.dictionary(pa.int32(), pa.string())))
+            elif column in PARQUET_FLOAT_COLUMNS:
+                fields.append(pa.field(column, pa.float64()))
+            else:
+                fields.append(pa.field(column, pa.string()))
+        return pa.schema(fields)
+    
+    def open(self):
+        if pq is None:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+        self._schema = self.schema()
+        self._writer = pq.ParquetWriter(self.filename, self._schema, compression='zstd')
+        self._columns = {column: [] for column in REVIEW_HEADERS}
+        self.count = 0
+    
+    def write_rows(self, prof, rows):
+        for row in rows:
+            for column in REVIEW_HEADERS:
+                value = row.get(column, '')
+                if column in PARQUET_FLOAT_COLUMNS:
+                    value = float(value) if value not in ('', None) else None
+                else:
+                    value = str(value)
+                self._columns[column].append(value)
+            self.count += 1
+        
+        if len(self._columns['review_id']) >= self.row_group_size:
+            self._flush()
+    
+    def _flush(self):
+        if not self._columns['review_id']:
+            return
+        table = pa.Table.from_pydict(self._columns, schema=self._schema)
+        self._writer.write_table(table)
+        self._columns = {column: [] for column in REVIEW_HEADERS}
+    
+    def close(self):
+        self._flush()
+        self._writer.close()
+        self._writer = None
+        print(f"✅ Parquet reviews saved to {self.filename} ({self.count} reviews)")
+    
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        super().abort()
+
+def review_sort_key(row):
+    """Canonical review order: professor, course, post date, review ID"""
+    return tuple(str(row.get(field, '')) for field in REVIEW_SORT_FIELDS)
+
+class ExternalSorter:
+    """Sort CSV rows that may not fit in memory (external merge sort)
+    
+    Rows are buffered and, every chunk_rows rows, sorted and spilled to a
+    temporary CSV run. sorted_rows() then streams a k-way merge of the runs,
+    so memory is bounded by chunk_rows no matter how many rows were added.
+    Small inputs never touch the disk.
+    """
+    
+    def __init__(self, headers, key, chunk_rows=DEFAULT_SORT_CHUNK_ROWS, temp_dir=None):
+        self.headers = headers
+        self.key = key
+        self.chunk_rows = chunk_rows
+        self.temp_dir = temp_dir
+        self._buffer = []
+        self._runs = []
+    
+    def add(self, row):
+        self._buffer.append(row)
+        if len(self._buffer) >= self.chunk_rows:
+            self._spill()
+    
+    def _spill(self):
+        self._buffer.sort(key=self.key)
+        with tempfile.NamedTemporaryFile('w', newline='', encoding='utf-8', suffix='.sortrun', dir=self.temp_dir, delete=False) as run_file:
+            writer = csv.DictWriter(run_file, fieldnames=self.headers)
+            writer.writerows(self._buffer)
+            self._runs.append(run_file.name)
+        self._buffer = []
+    
+    def sorted_rows(self):
+        """Yield every added row in key order, then remove the temporary runs"""
+        if not self._runs:
+            self._buffer.sort(key=self.key)
+            yield from self._buffer
+            self._buffer = []
+            return
+        
+        if self._buffer:
+            self._spill()
+        run_files = [open(run, newline='', encoding='utf-8') for run in self._runs]
+        try:
+            readers = [csv.DictReader(run_file, fieldnames=self.headers) for run_file in run_files]
+            yield from heapq.merge(*readers, key=self.key)
+        finally:
+            for run_file in run_files:
+                run_file.close()
+            self.cleanup()
+    
+    def cleanup(self):
+        for run in self._runs:
+            if os.path.exists(run):
+                os.remove(run)
+        self._runs = []
+        self._buffer = []
+
+def review_shard_name(department):
+    """Filesystem-safe shard name for a department code"""
+    name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in str(department or '').strip())
+    return name or 'UNKNOWN'
+
+class ReviewShardOutput(ReviewOutput):
+    """Detailed reviews split into one CSV per department, each in canonical order
+    
+    Rows are spooled to a per-department file as they arrive; close() sorts
+    each shard (small enough to fit in memory) and writes <DEPT>.csv with the
+    usual headers, so an unchanged department produces an identical file.
+    With compression, tracking shards get the matching .gz/.zst suffix.
+    """
+    
+    def __init__(self, directory, compression='none'):
+        super().__init__(directory)
+        self.suffix = COMPRESSION_SUFFIXES[compression]
+        self._spools = {}
+    
+    def _spool_filename(self, shard):
+        return os.path.join(self.filename, f".{shard}.spool")
+    
+    def open(self):
+        os.makedirs(self.filename, exist_ok=True)
+        self._spools = {}
+        self.count = 0
+    
+    def write_rows(self, prof, rows):
+        for row in rows:
+            shard = review_shard_name(row.get('professor_department'))
+            if shard not in self._spools:
+                spool = open(self._spool_filename(shard), 'w', newline='', encoding='utf-8')
+                self._spools[shard] = (spool, csv.DictWriter(spool, fieldnames=REVIEW_HEADERS))
+            self._spools[shard][1].writerow(row)
+            self.count += 1
+    
+    def _close_spools(self):
+        for spool, _ in self._spools.values():
+            spool.close()
+    
+    def close(self):
+        self._close_spools()
+        for shard in sorted(self._spools):
+            spool_filename = self._spool_filename(shard)
+            with open(spool_filename, newline='', encoding='utf-8') as spool:
+                rows = sorted(csv.DictReader(spool, fieldnames=REVIEW_HEADERS), key=review_sort_key)
+            with open_text_output(os.path.join(self.filename, f"{shard}.csv{self.suffix}")) as shard_file:
+                writer = csv.DictWriter(shard_file, fieldnames=REVIEW_HEADERS)
+                writer.writeheader()
+                writer.writerows(rows)
+            os.remove(spool_filename)
+        print(f"✅ Review shards saved to {self.filename} ({len(self._spools)} departments, {self.count} reviews)")
+        self._spools = {}
+    
+    def abort(self):
+        self._close_spools()
+        self._spools = {}
+        if os.path.isdir(self.filename):
+            shutil.rmtree(self.filename)
+
+# CSV headers for the per-course summary; rows with an empty professor_id cover every professor
+COURSE_SUMMARY_HEADERS = [
+    'course_code', 'professor_id', 'review_count', 'avg_overall_rating',
+    'avg_presents_material_clearly', 'avg_recognizes_student_difficulties', 'grade_distribution'
+]
+COURSE_RATING_COLUMNS = ['overall_rating', 'presents_material_clearly', 'recognizes_student_difficulties']
+
+class CourseSummaryOutput(ReviewOutput):
+    """Per-course and per-(course, professor) review aggregates
+    
+    Running counts, rating sums and grade counts are updated as each
+    professor's rows stream past, so no second pass over the reviews is
+    needed. close() writes one row per course (professor_id empty) followed
+    by one row per professor who taught it, ordered by course then professor.
+    """
+    
+    def open(self):
+        self.groups = {}
+    
+    def _add(self, key, row):
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = {'count': 0, 'sums': [0.0] * len(COURSE_RATING_COLUMNS), 'rated': [0] * len(COURSE_RATING_COLUMNS), 'grades': {}}
+        group['count'] += 1
+        for i, column in enumerate(COURSE_RATING_COLUMNS):
+            value = row.get(column, '')
+            if value not in ('', None):
+                group['sums'][i] += float(value)
+                group['rated'][i] += 1
+        grade = row.get('grade') or 'N/A'
+        group['grades'][grade] = group['grades'].get(grade, 0) + 1
+    
+    def write_rows(self, prof, rows):
+        for row in rows:
+            course_code = row.get('course_code', '')
+            self._add((course_code, ''), row)
+            self._add((course_code, row.get('professor_id', '')), row)
+    
+    def close(self):
+        with open_text_output(self.filename) as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(COURSE_SUMMARY_HEADERS)
+            for (course_code, professor_id) in sorted(self.groups):
+                group = self.groups[(course_code, professor_id)]
+                averages = [round(total / rated, 2) if rated else '' for total, rated in zip(group['sums'], group['rated'])]
+                grades = '; '.join(f"{grade}:{count}" for grade, count in sorted(group['grades'].items()))
+                writer.writerow([course_code, professor_id, group['count']] + averages + [grades])
+        courses = sum(1 for _, professor_id in self.groups if not professor_id)
+        print(f"✅ Course summary saved to {self.filename} ({courses} courses)")
+
+# Schema of the SQLite store; table columns mirror the CSV headers
+SQLITE_SCHEMA = """
+CREATE TABLE professors (
+    id TEXT PRIMARY KEY,
+    firstName TEXT,
+    lastName TEXT,
+    fullName TEXT,
+    department TEXT,
+    numEvals INTEGER,
+    overallRating REAL,
+    materialClear REAL,
+    studentDifficulties REAL,
+    courses TEXT,
+    tags TEXT,
+    courses_count INTEGER,
+    tags_count INTEGER
+);
+CREATE TABLE professor_courses (
+    professor_id TEXT NOT NULL REFERENCES professors(id),
+    course_code TEXT NOT NULL,
+    PRIMARY KEY (professor_id, course_code)
+);
+CREATE TABLE reviews (
+    review_id TEXT,
+    professor_id TEXT NOT NULL REFERENCES professors(id),
+    course_code TEXT,
+    grade TEXT,
+    grade_level TEXT,
+    course_type TEXT,
+    overall_rating REAL,
+    presents_material_clearly REAL,
+    recognizes_student_difficulties REAL,
+    rating_text TEXT,
+    post_date TEXT
+);
+CREATE TABLE department_summary (
+    department TEXT PRIMARY KEY,
+    professor_count INTEGER,
+    avg_rating REAL,
+    total_evals INTEGER,
+    professor_ids TEXT,
+    median_rating REAL,
+    rating_stddev REAL,
+    weighted_rating REAL,
+    avg_material_clear REAL,
+    avg_student_difficulties REAL
+);
+-- Same columns as professor_detailed_reviews.csv
+CREATE VIEW professor_detailed_reviews AS
+    SELECT r.professor_id, p.fullName AS professor_name, p.department AS professor_department,
+           r.course_code, r.review_id, r.grade, r.grade_level, r.course_type, r.overall_rating,
+           r.presents_material_clearly, r.recognizes_student_difficulties, r.rating_text, r.post_date
+    FROM reviews r JOIN professors p ON p.id = r.professor_id;
+"""
+
+# Indexes are created after the bulk load, which is much faster than maintaining them per insert
+SQLITE_INDEXES = """
+CREATE INDEX idx_professors_department ON professors(department);
+CREATE INDEX idx_professor_courses_course ON professor_courses(course_code);
+CREATE INDEX idx_reviews_professor_id ON reviews(professor_id);
+CREATE INDEX idx_reviews_course_code ON reviews(course_code, post_date);
+CREATE INDEX idx_reviews_post_date ON reviews(post_date);
+CREATE INDEX idx_reviews_review_id ON reviews(review_id);
+"""
+
+# Review columns stored in the reviews table (name and department live on professors)
+SQLITE_REVIEW_COLUMNS = [column for column in REVIEW_HEADERS if column not in ('professor_name', 'professor_department')]
+
+class SqliteStoreOutput(ReviewOutput):
+    """Normalized SQLite database of professors, per-course reviews and department summaries
+    
+    Professors, their courses and reviews are inserted as rows stream in;
+    department summaries and indexes are added on close.
+    """
+    
+    def __init__(self, filename):
+        super().__init__(filename)
+        self._conn = None
+    
+    def open(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+        self._conn = sqlite3.connect(self.filename)
+        
+        # A fresh file that is only promoted once complete doesn't need a journal
+        self._conn.execute("PRAGMA journal_mode = OFF")
+        self._conn.execute("PRAGMA synchronous = OFF")
+        self._conn.executescript(SQLITE_SCHEMA)
+        self.stats = DepartmentStats()
+        self.count = 0
+    
+    def write_rows(self, prof, rows):
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO professors VALUES ({', '.join('?' * len(PROFESSOR_HEADERS))})",
+            [prof[field] for field in PROFESSOR_HEADERS]
+        )
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO professor_courses VALUES (?, ?)",
+            [(prof['id'], course) for course in prof['courses'].split('; ') if course]
+        )
+        self._conn.executemany(
+            f"INSERT INTO reviews ({', '.join(SQLITE_REVIEW_COLUMNS)}) VALUES ({', '.join('?' * len(SQLITE_REVIEW_COLUMNS))})",
+            [[row[column] for column in SQLITE_REVIEW_COLUMNS] for row in rows]
+        )
+        self.stats.add(prof)
+        self.count += len(rows)
+    
+    def close(self):
+        self._conn.executemany(
+            f"INSERT INTO department_summary VALUES ({', '.join('?' * len(DEPARTMENT_SUMMARY_HEADERS))})",
+            self.stats.rows()
+        )
+        self._conn.executescript(SQLITE_INDEXES)
+        self._conn.commit()
+        self._conn.execute("ANALYZE")
+        self._conn.close()
+        self._conn = None
+        print(f"✅ SQLite store saved to {self.filename} ({self.count} reviews)")
+    
+    def abort(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        super().abort()
+
+def _read_csv_rows(filename):
+    """Stream dict rows from a (possibly compressed) CSV written by this script"""
+    csv.field_size_limit(max(csv.field_size_limit(), 10 * 1024 * 1024))
+    with open_text_input(filename) as csvfile:
+        yield from csv.DictReader(csvfile)
+
+def _main_csv_files(filename):
+    """Files holding a data/main CSV's rows: the file itself, or the shards that replaced it"""
+    if os.path.exists(filename):
+        return [filename]
+    shard_dir = SHARDED_MAIN_FILES.get(filename)
+    if shard_dir and os.path.isdir(shard_dir):
+        return [os.path.join(shard_dir, name) for name in sorted(os.listdir(shard_dir)) if name.endswith('.csv')]
+    return []
+
+def _read_main_csv_rows(filename):
+    """Stream dict rows from a data/main CSV, reading its department shards if it was sharded"""
+    for part in _main_csv_files(filename):
+        yield from _read_csv_rows(part)
+
+def _professor_record_from_csv(row):
+    """Turn a professors_data.csv row back into a normalized professor record"""
+    record = Professor.from_mapping(row)
+    record['numEvals'] = int(row['numEvals'] or 0)
+    for field in ('overallRating', 'materialClear', 'studentDifficulties'):
+        record[field] = float(row[field] or 0)
+    return record
+
+def build_sqlite_store(db_filename="data/main/polyratings.db", professors_filename="data/main/professors_data.csv", reviews_filename="data/main/professor_detailed_reviews.csv"):
+    """Build the SQLite store from existing CSV outputs (e.g. data/main) without calling the API"""
+    reviews_by_professor = {}
+    for row in _read_main_csv_rows(reviews_filename):
+        reviews_by_professor.setdefault(row['professor_id'], []).append(Review.from_mapping(row))
+    
+    temp_filename = f"{db_filename}.{os.getpid()}.tmp"
+    output = SqliteStoreOutput(temp_filename)
+    try:
+        output.open()
+        for row in _read_csv_rows(professors_filename):
+            prof = _professor_record_from_csv(row)
+            output.write_rows(prof, reviews_by_professor.pop(prof['id'], []))
+        output.close()
+    except Exception:
+        output.abort()
+        raise
+    
+    os.replace(temp_filename, db_filename)
+    return True
+
+# Full-text search index: an FTS5 table over rating_text plus a digest per review,
+# so each update only touches reviews that were added, edited or removed
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS review_fts USING fts5(
+    rating_text,
+    review_id UNINDEXED,
+    professor_id UNINDEXED,
+    professor_name UNINDEXED,
+    course_code UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS review_digests (
+    review_id TEXT PRIMARY KEY,
+    fts_rowid INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+"""
+SEARCH_COLUMNS = ['rating_text', 'review_id', 'professor_id', 'professor_name', 'course_code']
+
+def update_search_index(index_filename=DEFAULT_SEARCH_INDEX_FILENAME, reviews_filename="data/main/professor_detailed_reviews.csv"):
+    """Bring the full-text index in line with a reviews CSV, touching only what changed
+    
+    Runs in one transaction, so readers see either the old or the new index.
+    Returns (added, updated, removed) review counts.
+    """
+    conn = sqlite3.connect(index_filename)
+    try:
+        conn.executescript(SEARCH_SCHEMA)
+        known = {review_id: (fts_rowid, digest) for review_id, fts_rowid, digest in conn.execute("SELECT review_id, fts_rowid, digest FROM review_digests")}
+        added = updated = 0
+        seen = set()
+        
+        with conn:
+            for row in _read_main_csv_rows(reviews_filename):
+                review_id = row['review_id']
+                seen.add(review_id)
+                values = [row.get(column, '') for column in SEARCH_COLUMNS]
+                digest = hashlib.sha1('\x1f'.join(values).encode('utf-8')).hexdigest()
+                
+                previous = known.get(review_id)
+                if previous is not None:
+                    if previous[1] == digest:
+                        continue
+                    conn.execute("DELETE FROM review_fts WHERE rowid = ?", (previous[0],))
+                    updated += 1
+                else:
+                    added += 1
+                
+                cursor = conn.execute("INSERT INTO review_fts (rating_text, review_id, professor_id, professor_name, course_code) VALUES (?, ?, ?, ?, ?)", values)
+                conn.execute("INSERT OR REPLACE INTO review_digests VALUES (?, ?, ?)", (review_id, cursor.lastrowid, digest))
+            
+            removed = [(review_id, fts_rowid) for review_id, (fts_rowid, _) in known.items() if review_id not in seen]
+            conn.executemany("DELETE FROM review_fts WHERE rowid = ?", [(fts_rowid,) for _, fts_rowid in removed])
+            conn.executemany("DELETE FROM review_digests WHERE review_id = ?", [(review_id,) for review_id, _ in removed])
+        
+        if added or updated or removed:
+            conn.execute("INSERT INTO review_fts (review_fts) VALUES ('optimize')")
+            conn.commit()
+        return added, updated, len(removed)
+    finally:
+        conn.close()
+
+def _fts_query(text):
+    """Quote each word of a plain-text query so FTS5 operators in it are taken literally"""
+    words = [word.replace('"', '""') for word in text.split()]
+    return ' '.join(f'"{word}"' for word in words)
+
+def search_reviews(query, index_filename=DEFAULT_SEARCH_INDEX_FILENAME, limit=20, professor_id=None, course_code=None, raw=False):
+    """Reviews whose text matches query, best matches (BM25) first
+    
+    Words are ANDed together; pass raw=True to use FTS5 query syntax
+    (OR, NEAR, "phrases", prefix*). Each hit is a dict with the review's
+    IDs, professor name, course, score and a highlighted snippet.
+    """
+    sql = """
+        SELECT review_id, professor_id, professor_name, course_code,
+               bm25(review_fts) AS score,
+               snippet(review_fts, 0, '[', ']', '…', 16) AS snippet
+        FROM review_fts
+        WHERE review_fts MATCH ?
+    """
+    params = [query if raw else _fts_query(query)]
+    if professor_id:
+        sql += " AND professor_id = ?"
+        params.append(professor_id)
+    if course_code:
+        sql += " AND course_code = ?"
+        params.append(course_code)
+    sql += " ORDER BY score LIMIT ?"
+    params.append(limit)
+    
+    conn = sqlite3.connect(f"file:{index_filename}?mode=ro", uri=True)
+    try:
+        conn.row_factory = sqlite3.Row
+        return [dict(row) for row in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+class DetailedReviewsWriter:
+    """Engine-independent body of save_detailed_professor_reviews
+    
+    Sets up cached reviews (incremental), the checkpoint and the error budget
+    for the fetch iterator, then writes the (professor, review rows) pairs
+    it yields to the tracking CSV and every review output. Both the thread
+    and the async engine feed the same writer.
+    """
+    
+    def __init__(self, professors, tracking_filename, incremental=False, checkpoint_filename=DEFAULT_CHECKPOINT_FILENAME, max_failures=DEFAULT_ERROR_BUDGET, review_outputs=None, sort_rows=False):
+        self.tracking_filename = tracking_filename
+        self.cached_reviews = load_cached_reviews(professors) if incremental else {}
+        
+        # Resume from an interrupted run by reusing the professors it already fetched
+        self.checkpoint = ReviewCheckpoint(checkpoint_filename) if checkpoint_filename else None
+        if self.checkpoint is not None:
+            completed = self.checkpoint.load()
+            self.cached_reviews.update(completed)
+            self.checkpoint.open(completed)
+        
+        to_fetch = _professors_to_fetch(professors, self.cached_reviews)
+        self.error_budget = ErrorBudget(max_failures, professor_ids=[prof.get('id', '') for prof in to_fetch])
+        self.review_outputs = list(review_outputs or [])
+        self.sort_rows = sort_rows
+        self._file = None
+        self._sorter = None
+    
+    def open(self):
+        print(f"🔄 Saving to tracking file: {self.tracking_filename}")
+        self._file = open_text_output(self.tracking_filename)
+        self._writer = csv.DictWriter(self._file, fieldnames=REVIEW_HEADERS)
+        self._writer.writeheader()
+        
+        for output in self.review_outputs:
+            output.open()
+        
+        if self.sort_rows:
+            self._sorter = ExternalSorter(REVIEW_HEADERS, review_sort_key, temp_dir=os.path.dirname(self.tracking_filename) or None)
+        self.total_reviews = 0
+    
+    def write(self, prof, rows):
+        # Rows arrive in the order of the professors list, no matter which
+        # request finishes first, so output diffs stay stable
+        for row in rows:
+            if self._sorter is not None:
+                self._sorter.add(row)
+            else:
+                self._writer.writerow(row)
+            self.total_reviews += 1
+        for output in self.review_outputs:
+            output.write_rows(prof, rows)
+    
+    def close(self):
+        if self._sorter is not None:
+            self._writer.writerows(self._sorter.sorted_rows())
+        
+        for output in self.review_outputs:
+            output.close()
+        
+        self._file.close()
+        self._file = None
+        print(f"✅ Tracking file saved successfully: {self.tracking_filename}")
+        print(f"📊 Total reviews collected: {self.total_reviews}")
+        
+        # The tracking file now holds everything the checkpoint did
+        if self.checkpoint is not None:
+            self.checkpoint.clear()
+        return True
+    
+    def abort(self, error):
+        print(f"❌ Error saving to tracking file: {error}")
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._sorter is not None:
+            self._sorter.cleanup()
+        for output in self.review_outputs:
+            output.abort()
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+            print(f"♻️  Progress kept in {self.checkpoint.filename}, rerun to resume")
+
+def save_detailed_professor_reviews(professors, main_filename="data/main/professor_detailed_reviews.csv", tracking_filename=None, max_workers=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE, incremental=False, checkpoint_filename=DEFAULT_CHECKPOINT_FILENAME, max_failures=DEFAULT_ERROR_BUDGET, review_outputs=None, sort_rows=False):
+    """Save detailed professor reviews to CSV files (tracking first, then main for safety)
+    
+    With incremental=True, professors unchanged since the data/main snapshot
+    reuse their existing reviews and only new or changed ones are fetched.
+    Fetched professors are checkpointed to checkpoint_filename, so a rerun
+    after a crash only fetches what is still missing. Up to max_failures
+    professors may fail after retries; they keep their previous reviews.
+    review_outputs (ReviewOutput instances) receive the same rows as the CSV.
+    With sort_rows=True the CSV is written in canonical review order
+    (professor ID, course code, post date, review ID) instead of fetch order.
+    """
+    if not professors:
+        print("❌ No professor data to save")
+        return False
+    
+    writer = DetailedReviewsWriter(professors, tracking_filename, incremental, checkpoint_filename, max_failures, review_outputs, sort_rows)
+    
+    # First, save to tracking file
+    tracking_success = False
+    if tracking_filename:
+        try:
+            writer.open()
+            for prof, rows in iter_professor_review_rows(professors, max_workers, batch_size, writer.cached_reviews, writer.checkpoint, writer.error_budget):
+                writer.write(prof, rows)
+            tracking_success = writer.close()
+        except Exception as e:
+            writer.abort(e)
+            return False
+    
+    # Only update main file if tracking was successful
+    if tracking_success and main_filename:
+        return copy_tracking_to_main(tracking_filename, main_filename)
+    
+    return tracking_success
+
+def _file_sha256(filename):
+    """SHA-256 of a file's content, decompressing .gz/.zst files, read in chunks"""
+    digest = hashlib.sha256()
+    if _compression_of(filename) == 'none':
+        with open(filename, 'rb') as source:
+            for chunk in iter(lambda: source.read(1024 * 1024), b''):
+                digest.update(chunk)
+    else:
+        with open_text_input(filename) as source:
+            for chunk in iter(lambda: source.read(1024 * 1024), ''):
+                digest.update(chunk.encode('utf-8'))
+    return digest.hexdigest()
+
+def output_digest(filename):
+    """SHA-256 of an output's content, from the write-time hash when available"""
+    if filename in _output_digests:
+        return _output_digests[filename]
+    return _file_sha256(filename)
+
+def output_unchanged(tracking_filename, main_filename):
+    """Whether a main file already holds exactly the tracking file's content"""
+    if not os.path.exists(main_filename):
+        return False
+    return output_digest(tracking_filename) == _file_sha256(main_filename)
+
+def promote_files(file_pairs):
+    """Promote (tracking, main) file pairs as one logical transaction
+    
+    Main files whose content already matches their tracking file are left
+    alone (no copy, no mtime change). Each remaining tracking file is first
+    hard-linked (O(1), no bytes copied) or, where links aren't possible or
+    the tracking file is compressed, copied to a temp name next to its main
+    file. Only once every file is staged are they renamed into place with
+    os.replace, so readers never see a partial main file and a failed
+    staging step leaves every main file untouched.
+    
+    Returns the main filenames that were replaced.
+    """
+    staged = []
+    try:
+        for tracking_filename, main_filename in file_pairs:
+            if output_unchanged(tracking_filename, main_filename):
+                continue
+            main_dir = os.path.dirname(main_filename) or '.'
+            os.makedirs(main_dir, exist_ok=True)
+            temp_filename = os.path.join(main_dir, f".{os.path.basename(main_filename)}.{os.getpid()}.tmp")
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            
+            if _compression_of(tracking_filename) != _compression_of(main_filename):
+                # Compressed tracking snapshot, plain main file: stream-decompress
+                with open_text_input(tracking_filename) as source, open_text_output(temp_filename) as target:
+                    shutil.copyfileobj(source, target, 1024 * 1024)
+            else:
+                try:
+                    os.link(tracking_filename, temp_filename)
+                except OSError:
+                    shutil.copy2(tracking_filename, temp_filename)
+            staged.append((temp_filename, main_filename))
+    except Exception:
+        for temp_filename, _ in staged:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+        raise
+    
+    for temp_filename, main_filename in staged:
+        os.replace(temp_filename, main_filename)
+    return [main_filename for _, main_filename in staged]
+
+def copy_tracking_to_main(tracking_filename, main_filename):
+    """Atomically replace a main file with a successfully written tracking file"""
+    try:
+        print(f"🔄 Promoting tracking data to main file: {main_filename}")
+        if promote_files([(tracking_filename, main_filename)]):
+            print(f"✅ Main file updated successfully: {main_filename}")
+        else:
+            print(f"✅ Main file already up to date: {main_filename}")
+        return True
+    except Exception as e:
+        print(f"❌ Error promoting to main file: {e}")
+        print("⚠️  Tracking file is safe, but main file update failed")
+        return False
+
+async def fetch_professor_data_async(client):
+    """Fetch professor data from the PolyRatings API on the running event loop"""
+    try:
+        print("🔄 Fetching professor data from API...")
+        response = await api_get_async(client, PROFESSORS_ALL_URL)
+        response.raise_for_status()
+        
+        data = response.json()
+        professors = data.get('result', {}).get('data', [])
+        
+        print(f"✅ Successfully fetched {len(professors)} professors")
+        return professors
+        
+    except httpx.HTTPError as e:
+        print(f"❌ Error fetching data: {e}")
+        return None
+    except json.JSONDecodeError as e:
+        print(f"❌ Error parsing JSON: {e}")
+        return None
+
+async def fetch_detailed_professor_data_async(client, professor_id):
+    """Fetch detailed professor data including reviews on the running event loop"""
+    api_url = PROFESSORS_GET_URL.format(professor_id=professor_id)
+    
+    try:
+        return _professor_detail_from_response(await api_get_async(client, api_url))
+        
+    except httpx.HTTPError as e:
+        print(f"❌ Error fetching detailed data for professor {professor_id}: {e}")
+        return None
+    except json.JSONDecodeError as e:
+        print(f"❌ Error parsing JSON for professor {professor_id}: {e}")
+        return None
+
+async def fetch_detailed_professor_data_batch_async(client, professor_ids):
+    """Fetch detailed data for several professors in one tRPC batch request on the running event loop"""
+    professor_ids = list(professor_ids)
+    api_url = _build_batch_url(professor_ids)
+    
+    try:
+        return _batch_details_from_response(professor_ids, await api_get_async(client, api_url))
+        
+    except httpx.HTTPError as e:
+        print(f"❌ Error fetching detailed data for batch of {len(professor_ids)} professors: {e}")
+    except (json.JSONDecodeError, ValueError) as e:
+        print(f"❌ Error parsing JSON for batch of {len(professor_ids)} professors: {e}")
+    
+    return [None] * len(professor_ids)
+
+async def iter_detailed_professor_data_async(client, professors, concurrency=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield (professor, detailed_data) pairs in input order, keeping up to concurrency requests in flight"""
+    concurrency = max(1, concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def fetch_batch(batch):
+        async with semaphore:
+            _announce_batch(batch)
+            
+            if len(batch) == 1:
+                results = [await fetch_detailed_professor_data_async(client, batch[0].get('id', ''))]
+            else:
+                results = await fetch_detailed_professor_data_batch_async(client, [prof.get('id', '') for prof in batch])
+            
+            return results
+    
+    pending = deque()
+    try:
+        for batch in _chunked(professors, max(1, batch_size)):
+            pending.append((batch, asyncio.ensure_future(fetch_batch(batch))))
+            
+            # Only schedule a bounded number of tasks ahead of the writer
+            if len(pending) >= concurrency * 2:
+                batch_done, task = pending.popleft()
+                for pair in zip(batch_done, await task):
+                    yield pair
+        
+        while pending:
+            batch_done, task = pending.popleft()
+            for pair in zip(batch_done, await task):
+                yield pair
+    finally:
+        # Stop (and wait for) requests still in flight, so none outlive the client
+        for _, task in pending:
+            task.cancel()
+        await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+
+async def iter_professor_review_rows_async(client, professors, concurrency=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE, cached_reviews=None, checkpoint=None, error_budget=None):
+    """Async counterpart of iter_professor_review_rows"""
+    cached_reviews = cached_reviews or {}
+    fetched = iter_detailed_professor_data_async(client, _professors_to_fetch(professors, cached_reviews), concurrency, batch_size)
+    
+    # Async generators aren't closed when the consumer stops early, so close
+    # the fetcher explicitly to cancel its pending requests
+    try:
+        for prof in professors:
+            prof_id = prof.get('id', '')
+            if prof_id in cached_reviews:
+                yield prof, _cached_review_rows(prof, cached_reviews[prof_id])
+            else:
+                _, detailed_data = await fetched.__anext__()
+                yield prof, _fetched_review_rows(prof, detailed_data, checkpoint, error_budget)
+    finally:
+        await fetched.aclose()
+
+async def save_detailed_professor_reviews_async(professors, client, main_filename="data/main/professor_detailed_reviews.csv", tracking_filename=None, concurrency=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE, incremental=False, checkpoint_filename=DEFAULT_CHECKPOINT_FILENAME, max_failures=DEFAULT_ERROR_BUDGET, review_outputs=None, sort_rows=False):
+    """Async counterpart of save_detailed_professor_reviews (tracking first, then main for safety)"""
+    if not professors:
+        print("❌ No professor data to save")
+        return False
+    
+    writer = DetailedReviewsWriter(professors, tracking_filename, incremental, checkpoint_filename, max_failures, review_outputs, sort_rows)
+    
+    # First, save to tracking file
+    tracking_success = False
+    if tracking_filename:
+        review_rows = iter_professor_review_rows_async(client, professors, concurrency, batch_size, writer.cached_reviews, writer.checkpoint, writer.error_budget)
+        try:
+            writer.open()
+            async for prof, rows in review_rows:
+                writer.write(prof, rows)
+            tracking_success = writer.close()
+        except Exception as e:
+            writer.abort(e)
+            return False
+        finally:
+            await review_rows.aclose()
+    
+    # Only update main file if tracking was successful
+    if tracking_success and main_filename:
+        return copy_tracking_to_main(tracking_filename, main_filename)
+    
+    return tracking_success
+
+def save_department_summary(professors, filename="department_summary.csv", sort_rows=False):
+    """Save department-level summary statistics (overwrites existing file), optionally ordered by department"""
+    if not professors:
+        print("❌ No professor data to save")
+        return False
+    
+    return run_pipeline(professors, [DepartmentSummarySink(filename, sort_rows)])
+
+class OutputSink:
+    """One output of the single-pass pipeline
+    
+    The pipeline calls open() once, write(record) for every normalized
+    professor, then close(), which returns whether the output was saved.
+    With sort_rows=True a sink writes its rows in a canonical order instead
+    of the order the API returned professors in.
+    """
+    
+    error_message = "❌ Error saving output"
+    
+    def __init__(self, filename, sort_rows=False):
+        self.filename = filename
+        self.sort_rows = sort_rows
+        self._file = None
+    
+    def _open_csv(self):
+        self._file = open_text_output(self.filename)
+        return self._file
+    
+    def open(self):
+        pass
+    
+    def write(self, record):
+        pass
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return True
+    
+    def abort(self):
+        """Discard a partially written output"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.filename and os.path.exists(self.filename):
+            os.remove(self.filename)
+
+class ProfessorsCsvSink(OutputSink):
+    """Full professor data, one row per professor"""
+    
+    error_message = "❌ Error saving to CSV"
+    
+    def open(self):
+        self._writer = csv.DictWriter(self._open_csv(), fieldnames=PROFESSOR_HEADERS)
+        self._writer.writeheader()
+        self._pending = []
+        self.count = 0
+    
+    def write(self, record):
+        if self.sort_rows:
+            self._pending.append(record)
+        else:
+            self._writer.writerow(record)
+        self.count += 1
+    
+    def close(self):
+        self._writer.writerows(sorted(self._pending, key=lambda record: record['id']))
+        super().close()
+        print(f"✅ Data saved to {self.filename}")
+        print(f"📊 Total professors: {self.count}")
+        return True
+
+# Common nicknames, so "Bob Smith" finds Robert Smith and "Christopher Clark" finds Chris Clark
+NICKNAMES = {
+    'alexander': ['alex'], 'alexandra': ['alex'], 'andrew': ['andy', 'drew'], 'anthony': ['tony'],
+    'benjamin': ['ben'], 'catherine': ['cathy', 'kate'], 'charles': ['charlie', 'chuck'],
+    'christine': ['chris'], 'christopher': ['chris'], 'cynthia': ['cindy'], 'daniel': ['dan', 'danny'],
+    'david': ['dave'], 'deborah': ['deb', 'debbie'], 'donald': ['don'], 'douglas': ['doug'],
+    'edward': ['ed', 'eddie', 'ted'], 'elizabeth': ['beth', 'liz'], 'frederick': ['fred'],
+    'gerald': ['jerry'], 'gregory': ['greg'], 'jacob': ['jake'], 'james': ['jim', 'jimmy'],
+    'jeffrey': ['jeff'], 'jennifer': ['jen', 'jenny'], 'john': ['jack', 'johnny'], 'jonathan': ['jon'],
+    'joseph': ['joe'], 'joshua': ['josh'], 'katherine': ['kate', 'kathy', 'katie'], 'kenneth': ['ken'],
+    'kimberly': ['kim'], 'lawrence': ['larry'], 'margaret': ['maggie', 'meg', 'peggy'],
+    'matthew': ['matt'], 'michael': ['mike'], 'nicholas': ['nick'], 'pamela': ['pam'],
+    'patricia': ['pat', 'patty'], 'patrick': ['pat'], 'peter': ['pete'], 'philip': ['phil'],
+    'phillip': ['phil'], 'raymond': ['ray'], 'rebecca': ['becky'], 'richard': ['dick', 'rich', 'rick'],
+    'robert': ['bob', 'bobby', 'rob'], 'ronald': ['ron'], 'samantha': ['sam'], 'samuel': ['sam'],
+    'stephen': ['steve'], 'steven': ['steve'], 'susan': ['sue'], 'thomas': ['tom', 'tommy'],
+    'timothy': ['tim'], 'victoria': ['vicky'], 'william': ['bill', 'billy', 'will'], 'zachary': ['zach']
+}
+
+def _nickname_variants():
+    """Map each first name to the names it may also be written as, in both directions"""
+    variants = {}
+    for formal, nicknames in NICKNAMES.items():
+        for nickname in nicknames:
+            variants.setdefault(formal, set()).add(nickname)
+            variants.setdefault(nickname, set()).add(formal)
+    return variants
+
+NICKNAME_VARIANTS = _nickname_variants()
+
+# Memory-mapped name index: header, then fixed-size tables, then a blob of UTF-8 strings and postings
+NAME_INDEX_MAGIC = b'PRNI'
+NAME_INDEX_VERSION = 1
+NAME_INDEX_HEADER = struct.Struct('<4s9I')
+NAME_INDEX_PROFESSOR = struct.Struct('<5I')  # id offset/length, name offset/length, trigram count
+NAME_INDEX_ENTRY = struct.Struct('<4I')  # key offset/length, postings offset/count
+NAME_INDEX_SLOT = struct.Struct('<I')
+
+def normalize_name(name):
+    """Lowercase, accent-free, punctuation-free form of a name used for matching"""
+    decomposed = unicodedata.normalize('NFKD', str(name or ''))
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(''.join(c if c.isalnum() else ' ' for c in stripped.lower()).split())
+
+def name_keys(first_name, last_name, full_name=''):
+    """Normalized exact-match keys for one professor: full name, first + last, last + first, last, nicknames"""
+    first_words = normalize_name(first_name).split()
+    last = normalize_name(last_name)
+    keys = {normalize_name(full_name or f"{first_name} {last_name}")}
+    if last:
+        keys.add(last)
+    if first_words and last:
+        first = first_words[0]
+        keys.update({f"{first} {last}", f"{last} {first}", f"{' '.join(first_words)} {last}"})
+        for variant in NICKNAME_VARIANTS.get(first, ()):
+            keys.update({f"{variant} {last}", f"{last} {variant}"})
+    keys.discard('')
+    return keys
+
+def name_trigrams(name):
+    """Trigrams of each normalized word, padded so word starts and ends count"""
+    trigrams = set()
+    for word in normalize_name(name).split():
+        padded = f" {word} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+def _fnv1a(data):
+    """32-bit FNV-1a hash (stable across runs, unlike hash())"""
+    value = 0x811c9dc5
+    for byte in data:
+        value = ((value ^ byte) * 0x01000193) & 0xffffffff
+    return value
+
+def name_index_filename(csv_filename):
+    """Name index path that goes with a name-to-ID CSV (compressed or not)"""
+    base = csv_filename[:-len(COMPRESSION_SUFFIXES[_compression_of(csv_filename)])] if _compression_of(csv_filename) != 'none' else csv_filename
+    return f"{os.path.splitext(base)[0]}.idx"
+
+def write_name_index(filename, professors):
+    """Write the memory-mappable name index for (id, full name, first name, last name) tuples
+    
+    Layout: header; professor table; key table sorted by key bytes (binary
+    search doubles as a flattened prefix trie); open-addressing hash table of
+    key numbers for exact lookups; trigram table sorted by trigram; blob of
+    UTF-8 strings and uint32 posting lists. All integers are little-endian.
+    """
+    professors = sorted(professors)
+    keys = {}
+    trigrams = {}
+    trigram_counts = []
+    for number, (_, full_name, first_name, last_name) in enumerate(professors):
+        for key in name_keys(first_name, last_name, full_name):
+            keys.setdefault(key.encode('utf-8'), []).append(number)
+        professor_trigrams = name_trigrams(full_name or f"{first_name} {last_name}")
+        trigram_counts.append(len(professor_trigrams))
+        for trigram in professor_trigrams:
+            trigrams.setdefault(trigram.encode('utf-8'), []).append(number)
+    
+    sorted_keys = sorted(keys)
+    sorted_trigrams = sorted(trigrams)
+    hash_slots = 1
+    while hash_slots < 2 * len(sorted_keys):
+        hash_slots *= 2
+    
+    professors_offset = NAME_INDEX_HEADER.size
+    keys_offset = professors_offset + NAME_INDEX_PROFESSOR.size * len(professors)
+    hash_offset = keys_offset + NAME_INDEX_ENTRY.size * len(sorted_keys)
+    trigrams_offset = hash_offset + NAME_INDEX_SLOT.size * hash_slots
+    blob_offset = trigrams_offset + NAME_INDEX_ENTRY.size * len(sorted_trigrams)
+    
+    blob = bytearray()
+    
+    def add_bytes(data):
+        offset = blob_offset + len(blob)
+        blob.extend(data)
+        return offset
+    
+    def add_postings(numbers):
+        while len(blob) % 4:
+            blob.append(0)
+        return add_bytes(struct.pack(f'<{len(numbers)}I', *numbers))
+    
+    tables = bytearray()
+    for number, (professor_id, full_name, first_name, last_name) in enumerate(professors):
+        id_bytes = professor_id.encode('utf-8')
+        name_bytes = (full_name or f"{first_name} {last_name}".strip()).encode('utf-8')
+        tables += NAME_INDEX_PROFESSOR.pack(add_bytes(id_bytes), len(id_bytes), add_bytes(name_bytes), len(name_bytes), trigram_counts[number])
+    
+    slots = [0] * hash_slots
+    for key_number, key in enumerate(sorted_keys):
+        tables += NAME_INDEX_ENTRY.pack(add_bytes(key), len(key), add_postings(keys[key]), len(keys[key]))
+        slot = _fnv1a(key) & (hash_slots - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (hash_slots - 1)
+        slots[slot] = key_number + 1
+    tables += struct.pack(f'<{hash_slots}I', *slots)
+    
+    for trigram in sorted_trigrams:
+        tables += NAME_INDEX_ENTRY.pack(add_bytes(trigram), len(trigram), add_postings(trigrams[trigram]), len(trigrams[trigram]))
+    
+    header = NAME_INDEX_HEADER.pack(
+        NAME_INDEX_MAGIC, NAME_INDEX_VERSION, len(professors), professors_offset,
+        len(sorted_keys), keys_offset, hash_slots, hash_offset, len(sorted_trigrams), trigrams_offset
+    )
+    with open(filename, 'wb') as index_file:
+        index_file.write(header)
+        index_file.write(tables)
+        index_file.write(blob)
+
+class NameIndex:
+    """Read-only view of a name index file through mmap
+    
+    Opening only reads the header; every lookup binary-searches or probes
+    the mapped tables directly, so there is nothing to parse up front.
+    Results are lists of {'id', 'name', 'match', 'score'} dicts.
+    """
+    
+    def __init__(self, filename):
+        self._file = open(filename, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.professor_count, self._professors_offset, self._key_count, self._keys_offset,
+         self._hash_slots, self._hash_offset, self._trigram_count, self._trigrams_offset) = NAME_INDEX_HEADER.unpack_from(self._map, 0)
+        if magic != NAME_INDEX_MAGIC or version != NAME_INDEX_VERSION:
+            self.close()
+            raise ValueError(f"{filename} is not a version {NAME_INDEX_VERSION} name index")
+    
+    def close(self):
+        self._map.close()
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def _entry(self, table_offset, number):
+        key_offset, key_length, postings_offset, postings_count = NAME_INDEX_ENTRY.unpack_from(self._map, table_offset + NAME_INDEX_ENTRY.size * number)
+        return self._map[key_offset:key_offset + key_length], postings_offset, postings_count
+    
+    def _postings(self, offset, count):
+        return struct.unpack_from(f'<{count}I', self._map, offset)
+    
+    def _professor(self, number, match, score=1.0):
+        id_offset, id_length, name_offset, name_length, _ = NAME_INDEX_PROFESSOR.unpack_from(self._map, self._professors_offset + NAME_INDEX_PROFESSOR.size * number)
+        return {
+            'id': self._map[id_offset:id_offset + id_length].decode('utf-8'),
+            'name': self._map[name_offset:name_offset + name_length].decode('utf-8'),
+            'match': match,
+            'score': score
+        }
+    
+    def _lower_bound(self, table_offset, count, target):
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(table_offset, middle)[0] < target:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+    
+    def exact(self, name):
+        """Professors with a name key equal to the normalized name"""
+        key = normalize_name(name).encode('utf-8')
+        if not key:
+            return []
+        mask = self._hash_slots - 1
+        slot = _fnv1a(key) & mask
+        while True:
+            (key_number,) = NAME_INDEX_SLOT.unpack_from(self._map, self._hash_offset + NAME_INDEX_SLOT.size * slot)
+            if not key_number:
+                return []
+            entry_key, postings_offset, postings_count = self._entry(self._keys_offset, key_number - 1)
+            if entry_key == key:
+                return [self._professor(number, 'exact') for number in self._postings(postings_offset, postings_count)]
+            slot = (slot + 1) & mask
+    
+    def prefix(self, text, limit=10):
+        """Professors with a name key starting with the normalized text, in key order"""
+        prefix = normalize_name(text).encode('utf-8')
+        if not prefix:
+            return []
+        results, seen = [], set()
+        number = self._lower_bound(self._keys_offset, self._key_count, prefix)
+        while number < self._key_count and len(results) < limit:
+            key, postings_offset, postings_count = self._entry(self._keys_offset, number)
+            if not key.startswith(prefix):
+                break
+            for professor in self._postings(postings_offset, postings_count):
+                if professor not in seen and len(results) < limit:
+                    seen.add(professor)
+                    results.append(self._professor(professor, 'prefix'))
+            number += 1
+        return results
+    
+    def fuzzy(self, text, limit=10, min_score=0.3):
+        """Professors sharing the most trigrams with text, for typos and partial names
+        
+        Score is the share of the query's trigrams found in the name, with
+        ties broken by how much of the name the query covers.
+        """
+        query_trigrams = name_trigrams(text)
+        if not query_trigrams:
+            return []
+        shared = {}
+        for trigram in query_trigrams:
+            target = trigram.encode('utf-8')
+            number = self._lower_bound(self._trigrams_offset, self._trigram_count, target)
+            if number < self._trigram_count:
+                key, postings_offset, postings_count = self._entry(self._trigrams_offset, number)
+                if key == target:
+                    for professor in self._postings(postings_offset, postings_count):
+                        shared[professor] = shared.get(professor, 0) + 1
+        
+        scored = []
+        for professor, count in shared.items():
+            score = count / len(query_trigrams)
+            if score >= min_score:
+                name_trigram_count = NAME_INDEX_PROFESSOR.unpack_from(self._map, self._professors_offset + NAME_INDEX_PROFESSOR.size * professor)[4]
+                scored.append((score, count / name_trigram_count, professor))
+        scored.sort(key=lambda item: (-item[0], -item[1], item[2]))
+        return [self._professor(professor, 'fuzzy', round(score, 3)) for score, _, professor in scored[:limit]]
+    
+    def lookup(self, text, limit=10):
+        """Best matches for a name: exact (incl. nicknames), then prefix, then fuzzy"""
+        return self.exact(text)[:limit] or self.prefix(text, limit) or self.fuzzy(text, limit)
+
+class NameToIdSink(OutputSink):
+    """Simplified mapping of professor names to IDs, plus its lookup index (.idx)"""
+    
+    error_message = "❌ Error saving name mapping"
+    
+    def open(self):
+        self._writer = csv.writer(self._open_csv())
+        self._writer.writerow(NAME_TO_ID_HEADERS)
+        self._pending = []
+        self._names = []
+    
+    def write(self, record):
+        row = [record[field] for field in NAME_TO_ID_HEADERS]
+        if self.sort_rows:
+            self._pending.append(row)
+        else:
+            self._writer.writerow(row)
+        self._names.append((record['id'], record['fullName'], record['firstName'], record['lastName']))
+    
+    def close(self):
+        id_index = NAME_TO_ID_HEADERS.index('id')
+        self._writer.writerows(sorted(self._pending, key=lambda row: row[id_index]))
+        super().close()
+        print(f"✅ Name-to-ID mapping saved to {self.filename}")
+        
+        index_filename = name_index_filename(self.filename)
+        write_name_index(index_filename, self._names)
+        print(f"✅ Name lookup index saved to {index_filename}")
+        return True
+    
+    def abort(self):
+        super().abort()
+        index_filename = name_index_filename(self.filename)
+        if os.path.exists(index_filename):
+            os.remove(index_filename)
+
+# CSV headers for the department summary; the statistics after professor_ids were added later
+DEPARTMENT_SUMMARY_HEADERS = [
+    'department', 'professor_count', 'avg_rating', 'total_evals', 'professor_ids',
+    'median_rating', 'rating_stddev', 'weighted_rating', 'avg_material_clear', 'avg_student_difficulties'
+]
+
+class DepartmentStats:
+    """Per-department aggregates over normalized professor records
+    
+    Records are collected column-wise as they stream in; rows() then computes
+    every statistic for all departments at once with NumPy (grouped bincount
+    sums plus one sort for the medians), or per department in pure Python
+    when NumPy isn't installed.
+    """
+    
+    def __init__(self):
+        self.departments = []
+        self.ids = []
+        self.ratings = []
+        self.evals = []
+        self.material_clear = []
+        self.student_difficulties = []
+    
+    def add(self, record):
+        self.departments.append(record['department'] or 'Unknown')
+        self.ids.append(record['id'])
+        self.ratings.append(record['overallRating'])
+        self.evals.append(record['numEvals'])
+        self.material_clear.append(record['materialClear'])
+        self.student_difficulties.append(record['studentDifficulties'])
+    
+    def _department_order(self):
+        """Department names in first-seen order, and each record's department index"""
+        index = {}
+        codes = [index.setdefault(dept, len(index)) for dept in self.departments]
+        return list(index), codes
+    
+    def _statistics_numpy(self, names, codes):
+        codes = np.asarray(codes, dtype=np.intp)
+        ratings = np.asarray(self.ratings, dtype=np.float64)
+        evals = np.asarray(self.evals, dtype=np.float64)
+        groups = len(names)
+        
+        counts = np.bincount(codes, minlength=groups)
+        mean_rating = np.bincount(codes, ratings, groups) / counts
+        total_evals = np.bincount(codes, evals, groups)
+        deviations = ratings - mean_rating[codes]
+        stddev = np.sqrt(np.bincount(codes, deviations * deviations, groups) / counts)
+        weighted_sum = np.bincount(codes, ratings * evals, groups)
+        weighted = np.divide(weighted_sum, total_evals, out=mean_rating.copy(), where=total_evals > 0)
+        material = np.bincount(codes, np.asarray(self.material_clear, dtype=np.float64), groups) / counts
+        difficulties = np.bincount(codes, np.asarray(self.student_difficulties, dtype=np.float64), groups) / counts
+        
+        # Sort by (department, rating) so each department's ratings are a contiguous sorted run
+        sorted_ratings = ratings[np.lexsort((ratings, codes))]
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        median = (sorted_ratings[starts + (counts - 1) // 2] + sorted_ratings[starts + counts // 2]) / 2
+        
+        return [
+            (int(counts[i]), float(mean_rating[i]), int(total_evals[i]), float(median[i]),
+             float(stddev[i]), float(weighted[i]), float(material[i]), float(difficulties[i]))
+            for i in range(groups)
+        ]
+    
+    def _statistics_python(self, names, codes):
+        members = [[] for _ in names]
+        for position, code in enumerate(codes):
+            members[code].append(position)
+        
+        results = []
+        for positions in members:
+            ratings = [self.ratings[p] for p in positions]
+            evals = [self.evals[p] for p in positions]
+            count = len(positions)
+            mean_rating = sum(ratings) / count
+            total_evals = sum(evals)
+            weighted = sum(r * e for r, e in zip(ratings, evals)) / total_evals if total_evals > 0 else mean_rating
+            results.append((
+                count, mean_rating, total_evals, statistics.median(ratings),
+                statistics.pstdev(ratings), weighted,
+                sum(self.material_clear[p] for p in positions) / count,
+                sum(self.student_difficulties[p] for p in positions) / count
+            ))
+        return results
+    
+    def rows(self, sort_rows=False):
+        """Summary rows in DEPARTMENT_SUMMARY_HEADERS order
+        
+        sort_rows orders departments by name and each department's
+        professor IDs, so the output doesn't depend on the API's order.
+        """
+        names, codes = self._department_order()
+        if not names:
+            return
+        stats = self._statistics_numpy(names, codes) if np is not None else self._statistics_python(names, codes)
+        
+        professors = [[] for _ in names]
+        for code, professor_id in zip(codes, self.ids):
+            professors[code].append(professor_id)
+        
+        order = sorted(range(len(names)), key=names.__getitem__) if sort_rows else range(len(names))
+        for i in order:
+            count, mean_rating, total_evals, median, stddev, weighted, material, difficulties = stats[i]
+            professor_ids = '; '.join(sorted(professors[i]) if sort_rows else professors[i])
+            
+            yield [
+                names[i],
+                count,
+                round(mean_rating, 2),
+                total_evals,
+                professor_ids,
+                round(median, 2),
+                round(stddev, 2),
+                round(weighted, 2),
+                round(material, 2),
+                round(difficulties, 2)
+            ]
+
+class DepartmentSummarySink(OutputSink):
+    """Department-level summary statistics, written once every professor was seen"""
+    
+    error_message = "❌ Error saving department summary"
+    
+    def open(self):
+        self.stats = DepartmentStats()
+    
+    def write(self, record):
+        self.stats.add(record)
+    
+    def close(self):
+        writer = csv.writer(self._open_csv())
+        writer.writerow(DEPARTMENT_SUMMARY_HEADERS)
+        writer.writerows(self.stats.rows(self.sort_rows))
+        
+        super().close()
+        print(f"✅ Department summary saved to {self.filename}")
+        return True
+
+class DetailedReviewsSink(OutputSink):
+    """Detailed reviews, fetched per professor once the professor list is complete
+    
+    Incremental refresh needs the whole list up front, so records are only
+    collected during the pass and the fetches start in close().
+    Keyword options are passed on to save_detailed_professor_reviews.
+    """
+    
+    error_message = "❌ Error saving to tracking file"
+    
+    def __init__(self, filename, **options):
+        super().__init__(filename)
+        self.options = options
+    
+    def open(self):
+        self.records = []
+    
+    def write(self, record):
+        self.records.append(record)
+    
+    def close(self):
+        print("\n📁 Fetching detailed professor reviews...")
+        print("⚠️  This may take a while as we fetch individual professor data...")
+        return save_detailed_professor_reviews(
+            self.records,
+            main_filename=None,  # Don't update main yet
+            tracking_filename=self.filename,
+            **self.options
+        )
+
+def _call_sink(sink, method, *args):
+    """Call a sink method, reporting (instead of raising) any error"""
+    try:
+        result = method(*args)
+        return True if result is None else result
+    except Exception as e:
+        print(f"{sink.error_message}: {e}")
+        return False
+
+def feed_sinks(professors, sinks, sample_size=3):
+    """Normalize each professor once and write it to every sink in a single pass
+    
+    Sinks that fail are dropped from the rest of the pass. Returns the number
+    of professors seen and the first sample_size records.
+    """
+    sinks[:] = [sink for sink in sinks if _call_sink(sink, sink.open)]
+    
+    count = 0
+    sample = []
+    for prof in professors:
+        record = normalize_professor(prof)
+        count += 1
+        if len(sample) < sample_size:
+            sample.append(record)
+        
+        for sink in list(sinks):
+            if not _call_sink(sink, sink.write, record):
+                sinks.remove(sink)
+    
+    return count, sample
+
+def close_sinks(sinks):
+    """Close every sink in order and return whether all of them saved successfully"""
+    success = True
+    for sink in sinks:
+        if not _call_sink(sink, sink.close):
+            success = False
+    return success
+
+def run_pipeline(professors, sinks):
+    """Feed professors to the sinks in one pass and close them, returning overall success"""
+    all_sinks = list(sinks)
+    feed_sinks(professors, sinks)
+    return close_sinks(sinks) and len(sinks) == len(all_sinks)
+
+def _row_digest(row, headers):
+    """Stable digest of a CSV row's values"""
+    return hashlib.sha1('\x1f'.join(str(row.get(field, '')) for field in headers).encode('utf-8')).hexdigest()
+
+
+def _apply_row_order(order, removed, inserts):
+    """Key order after dropping removed keys and inserting new keys after their anchors
+    
+    inserts maps an anchor key (None for the very start) to the keys that
+    directly follow it, in order; inserted keys can themselves be anchors.
+    """
+    removed = set(removed)
+    result = []
+    
+    def emit_after(anchor):
+        stack = list(reversed(inserts.get(anchor, [])))
+        while stack:
+            key = stack.pop()
+            result.append(key)
+            stack.extend(reversed(inserts.get(key, [])))
+    
+    emit_after(None)
+    for key in order:
+        if key not in removed:
+            result.append(key)
+            emit_after(key)
+    return result
+
+def compute_csv_delta(previous_filename, current_filename, key, headers):
+    """Added, removed and changed rows (by key column) between two CSV snapshots
+    
+    Added rows record the key of the row before them so reconstruction keeps
+    the file order; if rows were also reordered, the full key order is stored.
+    Only keys and digests of the previous file are held in memory.
+    """
+    previous_digests = {}
+    previous_order = []
+    for row in _read_main_csv_rows(previous_filename):
+        previous_digests[row[key]] = _row_digest(row, headers)
+        previous_order.append(row[key])
+    
+    added, changed, current_order = [], [], []
+    inserts = {}
+    last_key = None
+    for row in _read_csv_rows(current_filename):
+        row_key = row[key]
+        current_order.append(row_key)
+        if row_key not in previous_digests:
+            added.append({'after': last_key, 'row': row})
+            inserts.setdefault(last_key, []).append(row_key)
+        elif previous_digests[row_key] != _row_digest(row, headers):
+            changed.append(row)
+        last_key = row_key
+    
+    current_keys = set(current_order)
+    removed = [row_key for row_key in previous_order if row_key not in current_keys]
+    
+    delta = {'added': added, 'removed': removed, 'changed': changed}
+    if _apply_row_order(previous_order, removed, inserts) != current_order:
+        delta['order'] = current_order
+    return delta
+
+def apply_csv_delta(rows, delta, key):
+    """Apply a delta from compute_csv_delta to an iterable of rows, returning the new row list"""
+    rows_by_key = {}
+    order = []
+    for row in rows:
+        rows_by_key[row[key]] = row
+        order.append(row[key])
+    
+    for row in delta['changed']:
+        rows_by_key[row[key]] = row
+    
+    inserts = {}
+    for item in delta['added']:
+        rows_by_key[item['row'][key]] = item['row']
+        inserts.setdefault(item['after'], []).append(item['row'][key])
+    
+    order = delta.get('order') or _apply_row_order(order, delta['removed'], inserts)
+    return [rows_by_key[row_key] for row_key in order]
+
+# Tables kept in the delta snapshot store: (name, main file, key column, headers)
+SNAPSHOT_TABLES = [
+    ('reviews', "data/main/professor_detailed_reviews.csv", 'review_id', REVIEW_HEADERS),
+    ('professors', "data/main/professors_data.csv", 'id', PROFESSOR_HEADERS)
+]
+
+def _load_snapshot_manifest(snapshot_dir):
+    manifest_filename = os.path.join(snapshot_dir, 'manifest.json')
+    if not os.path.exists(manifest_filename):
+        return {'entries': []}
+    with open(manifest_filename, encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
+
+def _save_snapshot_manifest(snapshot_dir, manifest):
+    manifest_filename = os.path.join(snapshot_dir, 'manifest.json')
+    temp_filename = f"{manifest_filename}.tmp"
+    with open(temp_filename, 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(temp_filename, manifest_filename)
+
+def _write_csv_rows(filename, rows, headers):
+    with open_text_output(filename) as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=headers)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def record_delta_snapshot(timestamp, current_files, snapshot_dir=DEFAULT_SNAPSHOT_DIR, compression='gzip'):
+    """Store this run as a delta against the previous main files (or as a new base)
+    
+    current_files maps each SNAPSHOT_TABLES name to this run's tracking file;
+    the previous state is the data/main files before promotion. A new base is
+    written when there is none yet, the chain reached MAX_DELTA_CHAIN, or
+    data/main no longer matches the head of the chain.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    manifest = _load_snapshot_manifest(snapshot_dir)
+    entries = manifest['entries']
+    suffix = COMPRESSION_SUFFIXES[compression]
+    
+    chain_length = 0
+    for entry in reversed(entries):
+        if entry['type'] == 'base':
+            break
+        chain_length += 1
+    
+    head_matches = bool(entries) and all(
+        os.path.exists(main_filename) and entries[-1]['sha256'].get(name) == _file_sha256(main_filename)
+        for name, main_filename, _, _ in SNAPSHOT_TABLES
+    )
+    
+    entry = {'timestamp': timestamp, 'files': {}, 'sha256': {}}
+    if not head_matches or chain_length >= MAX_DELTA_CHAIN:
+        entry['type'] = 'base'
+        for name, _, _, _ in SNAPSHOT_TABLES:
+            base_filename = f"base_{timestamp}_{name}.csv{suffix}"
+            with open_text_input(current_files[name]) as source, open_text_output(os.path.join(snapshot_dir, base_filename)) as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+            entry['files'][name] = base_filename
+    else:
+        entry['type'] = 'delta'
+        delta = {'timestamp': timestamp, 'previous': entries[-1]['timestamp'], 'tables': {}}
+        for name, main_filename, key, headers in SNAPSHOT_TABLES:
+            delta['tables'][name] = compute_csv_delta(main_filename, current_files[name], key, headers)
+        
+        delta_filename = f"delta_{timestamp}.json.gz"
+        with gzip.open(os.path.join(snapshot_dir, delta_filename), 'wt', encoding='utf-8') as delta_file:
+            json.dump(delta, delta_file)
+        entry['files']['delta'] = delta_filename
+        
+        reviews = delta['tables']['reviews']
+        print(f"📊 Review delta: +{len(reviews['added'])} -{len(reviews['removed'])} ~{len(reviews['changed'])}")
+    
+    for name, _, _, _ in SNAPSHOT_TABLES:
+        entry['sha256'][name] = output_digest(current_files[name])
+    
+    entries.append(entry)
+    _save_snapshot_manifest(snapshot_dir, manifest)
+    print(f"✅ Stored {entry['type']} snapshot {timestamp} in {snapshot_dir}")
+    return True
+
+def reconstruct_snapshot(timestamp, output_dir, snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+    """Materialize the reviews and professors CSVs of any stored run into output_dir
+    
+    Replays the deltas on top of the latest base at or before timestamp.
+    Returns {table name: written filename}.
+    """
+    entries = _load_snapshot_manifest(snapshot_dir)['entries']
+    target = [i for i, entry in enumerate(entries) if entry['timestamp'] <= timestamp]
+    if not target:
+        raise ValueError(f"No snapshot stored at or before {timestamp}")
+    end = target[-1]
+    start = max(i for i in range(end + 1) if entries[i]['type'] == 'base')
+    
+    tables = {}
+    base = entries[start]
+    for name, _, _, _ in SNAPSHOT_TABLES:
+        tables[name] = list(_read_csv_rows(os.path.join(snapshot_dir, base['files'][name])))
+    
+    for entry in entries[start + 1:end + 1]:
+        with gzip.open(os.path.join(snapshot_dir, entry['files']['delta']), 'rt', encoding='utf-8') as delta_file:
+            delta = json.load(delta_file)
+        for name, _, key, _ in SNAPSHOT_TABLES:
+            tables[name] = apply_csv_delta(tables[name], delta['tables'][name], key)
+    
+    os.makedirs(output_dir, exist_ok=True)
+    written = {}
+    for name, main_filename, _, headers in SNAPSHOT_TABLES:
+        filename = os.path.join(output_dir, f"{os.path.splitext(os.path.basename(main_filename))[0]}_{entries[end]['timestamp']}.csv")
+        _write_csv_rows(filename, tables[name], headers)
+        written[name] = filename
+    return written
+
+class OutputOptions:
+    """Which optional outputs a run writes and how its tracking files are stored"""
+    
+    def __init__(self, parquet=False, sqlite=False, compression='none', snapshot_mode='full', shard_reviews=False, sort_rows=False, search_index=False):
+        self.parquet = parquet
+        self.search_index = search_index
+        self.sort_rows = sort_rows
+        self.sqlite = sqlite
+        self.shard_reviews = shard_reviews
+        self.compression = resolve_compression(compression)
+        self.snapshot_mode = snapshot_mode
+    
+    def tracking_csv(self, name, timestamp):
+        """Path of a timestamped tracking CSV, with the compression suffix if any"""
+        return f"data/tracking/{name}_{timestamp}.csv{COMPRESSION_SUFFIXES[self.compression]}"
+    
+    def tracking_shard_dir(self, timestamp):
+        """Folder holding this run's per-department review shards"""
+        return f"data/tracking/professor_detailed_reviews_{timestamp}_by_department"
+
+def tracking_sinks(timestamp, outputs=None):
+    """Sinks for the basic timestamped files in the tracking folder"""
+    outputs = outputs or OutputOptions()
+    return [
+        ProfessorsCsvSink(outputs.tracking_csv('professors_full_data', timestamp), outputs.sort_rows),
+        NameToIdSink(outputs.tracking_csv('professor_name_to_id', timestamp), outputs.sort_rows),
+        DepartmentSummarySink(outputs.tracking_csv('department_summary', timestamp), outputs.sort_rows)
+    ]
+
+def save_tracking_files(professors, timestamp, outputs=None):
+    """Save the basic timestamped files to the tracking folder"""
+    print("\n📁 Saving timestamped files to data/tracking/...")
+    return run_pipeline(professors, tracking_sinks(timestamp, outputs))
+
+# What each main file holds, for the end-of-run summary
+MAIN_FILE_DESCRIPTIONS = {
+    'professors_data.csv': "Full professor data",
+    'professor_name_to_id.csv': "Name to ID mapping",
+    'professor_name_to_id.idx': "Memory-mapped name lookup index",
+    'department_summary.csv': "Department statistics",
+    'course_summary.csv': "Per-course review statistics",
+    'professor_detailed_reviews.csv': "Detailed student reviews",
+    'professor_detailed_reviews.parquet': "Detailed student reviews (columnar)",
+    'polyratings.db': "SQLite store with indexes",
+    'reviews_by_department': "Detailed reviews, one CSV per department"
+}
+
+def main_file_pairs(timestamp, outputs=None):
+    """(tracking file, main file) pairs produced by one run"""
+    outputs = outputs or OutputOptions()
+    pairs = [
+        (outputs.tracking_csv('professors_full_data', timestamp), "data/main/professors_data.csv"),
+        (outputs.tracking_csv('professor_name_to_id', timestamp), "data/main/professor_name_to_id.csv"),
+        (name_index_filename(outputs.tracking_csv('professor_name_to_id', timestamp)), "data/main/professor_name_to_id.idx"),
+        (outputs.tracking_csv('department_summary', timestamp), "data/main/department_summary.csv"),
+        (outputs.tracking_csv('professor_detailed_reviews', timestamp), "data/main/professor_detailed_reviews.csv"),
+        (outputs.tracking_csv('course_summary', timestamp), "data/main/course_summary.csv")
+    ]
+    if outputs.parquet:
+        pairs.append((f"data/tracking/professor_detailed_reviews_{timestamp}.parquet", "data/main/professor_detailed_reviews.parquet"))
+    if outputs.sqlite:
+        pairs.append((f"data/tracking/polyratings_{timestamp}.db", "data/main/polyratings.db"))
+    if outputs.shard_reviews:
+        shard_dir = outputs.tracking_shard_dir(timestamp)
+        suffix = f".csv{COMPRESSION_SUFFIXES[outputs.compression]}"
+        if os.path.isdir(shard_dir):
+            for name in sorted(os.listdir(shard_dir)):
+                if name.endswith(suffix):
+                    main_name = name[:-len(suffix)] + '.csv'
+                    pairs.append((os.path.join(shard_dir, name), os.path.join(REVIEW_SHARD_DIR, main_name)))
+    return pairs
+
+def prune_review_shards(file_pairs):
+    """Remove main shards for departments that no longer have any reviews"""
+    if not os.path.isdir(REVIEW_SHARD_DIR):
+        return
+    current = {os.path.basename(main_filename) for _, main_filename in file_pairs
+               if os.path.dirname(main_filename) == REVIEW_SHARD_DIR}
+    for name in os.listdir(REVIEW_SHARD_DIR):
+        if name.endswith('.csv') and name not in current:
+            os.remove(os.path.join(REVIEW_SHARD_DIR, name))
+            print(f"🗑️  Removed stale review shard: {name}")
+
+def switch_review_layout(shard_reviews):
+    """Drop the data/main review layout this run didn't write, so only one copy is committed"""
+    if shard_reviews:
+        for main_filename in SHARDED_MAIN_FILES:
+            if os.path.exists(main_filename):
+                os.remove(main_filename)
+                print(f"🗑️  Removed {main_filename}, the reviews now live in {REVIEW_SHARD_DIR}/")
+    elif os.path.isdir(REVIEW_SHARD_DIR):
+        shutil.rmtree(REVIEW_SHARD_DIR)
+        print(f"🗑️  Removed {REVIEW_SHARD_DIR}/, the reviews are back in one CSV")
+
+def _summarize_pairs(file_pairs):
+    """File pairs for the run summary, with review shards folded into one entry"""
+    shards = [pair for pair in file_pairs if os.path.dirname(pair[1]) == REVIEW_SHARD_DIR]
+    summary = [pair for pair in file_pairs if pair not in shards]
+    if shards:
+        summary.append((os.path.dirname(shards[0][0]), REVIEW_SHARD_DIR))
+    return summary
+
+def update_main_files(sample, file_pairs, success, timestamp=None, outputs=None):
+    """Promote the tracking files to main if the run succeeded, then print a summary"""
+    outputs = outputs or OutputOptions()
+    removed_tracking = set()
+    
+    # With shards, the monolithic reviews CSV stays a tracking file only
+    promoted_pairs = [(tracking, main) for tracking, main in file_pairs
+                      if not (outputs.shard_reviews and main in SHARDED_MAIN_FILES)]
+    
+    # Only update main files if tracking was successful
+    if success:
+        # Delta snapshots compare against data/main, so record them before promoting
+        snapshot_stored = False
+        if outputs.snapshot_mode == 'delta':
+            try:
+                current_files = {name: tracking for tracking, main in file_pairs
+                                 for name, main_filename, _, _ in SNAPSHOT_TABLES if main == main_filename}
+                snapshot_stored = record_delta_snapshot(timestamp, current_files, compression=outputs.compression if outputs.compression != 'none' else 'gzip')
+            except Exception as e:
+                print(f"⚠️  Could not store delta snapshot, keeping full tracking files: {e}")
+        
+        print("\n📁 Updating main files from successful tracking data...")
+        
+        # Promote tracking files to main (all-or-nothing atomic renames)
+        try:
+            changed = promote_files(promoted_pairs)
+            print("✅ All main files updated successfully from tracking data")
+            for _, main_filename in promoted_pairs:
+                if os.path.dirname(main_filename) != REVIEW_SHARD_DIR:
+                    status = "changed" if main_filename in changed else "unchanged, skipped"
+                    print(f"   • {os.path.basename(main_filename)}: {status}")
+            if outputs.shard_reviews:
+                shard_count = sum(1 for _, main_filename in file_pairs if os.path.dirname(main_filename) == REVIEW_SHARD_DIR)
+                changed_shards = sum(1 for main_filename in changed if os.path.dirname(main_filename) == REVIEW_SHARD_DIR)
+                print(f"   • {os.path.basename(REVIEW_SHARD_DIR)}/: {changed_shards} of {shard_count} shards changed")
+                prune_review_shards(file_pairs)
+            switch_review_layout(outputs.shard_reviews)
+            
+            if outputs.search_index:
+                try:
+                    added, updated, removed = update_search_index()
+                    print(f"🔎 Search index updated: +{added} ~{updated} -{removed} reviews")
+                except Exception as e:
+                    print(f"⚠️  Could not update search index {DEFAULT_SEARCH_INDEX_FILENAME}: {e}")
+            
+            # The delta store now covers these, so drop the full copies
+            if snapshot_stored:
+                for name, _, _, _ in SNAPSHOT_TABLES:
+                    os.remove(current_files[name])
+                    removed_tracking.add(current_files[name])
+        except Exception as e:
+            print(f"❌ Error promoting tracking files to main: {e}")
+            print("⚠️  Tracking files are safe, but main files may be outdated")
+    else:
+        print("⚠️  Skipping main file updates due to tracking failures")
+    
+    print("\n📁 Files created:")
+    print("  📂 data/main/")
+    for _, main_filename in _summarize_pairs(promoted_pairs):
+        name = os.path.basename(main_filename)
+        print(f"    • {name} - {MAIN_FILE_DESCRIPTIONS.get(name, 'Derived data')}")
+    print("  📂 data/tracking/")
+    for tracking_filename, _ in _summarize_pairs(file_pairs):
+        if tracking_filename not in removed_tracking:
+            print(f"    • {os.path.basename(tracking_filename)}")
+    
+    # Show some sample data
+    print(f"\n📊 Sample data (first 3 professors):")
+    for i, prof in enumerate(sample[:3]):
+        name = f"{prof.get('firstName', '')} {prof.get('lastName', '')}".strip()
+        dept = prof.get('department', '')
+        rating = prof.get('overallRating', 0)
+        evals = prof.get('numEvals', 0)
+        print(f"  {i+1}. {name} ({dept}) - Rating: {rating}, Evals: {evals}")
+
+def review_outputs_for_run(timestamp, outputs=None):
+    """Extra review outputs requested for this run"""
+    outputs = outputs or OutputOptions()
+    review_outputs = [CourseSummaryOutput(outputs.tracking_csv('course_summary', timestamp))]
+    if outputs.parquet:
+        review_outputs.append(ReviewParquetOutput(f"data/tracking/professor_detailed_reviews_{timestamp}.parquet"))
+    if outputs.sqlite:
+        review_outputs.append(SqliteStoreOutput(f"data/tracking/polyratings_{timestamp}.db"))
+    if outputs.shard_reviews:
+        review_outputs.append(ReviewShardOutput(outputs.tracking_shard_dir(timestamp), outputs.compression))
+    return review_outputs
+
+def main(max_workers=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE, incremental=False, resume=True, rate=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_BURST, max_attempts=DEFAULT_MAX_ATTEMPTS, max_failures=DEFAULT_ERROR_BUDGET, outputs=None):
+    """Main function to fetch and save professor data"""
+    print("🚀 PolyRatings Professor Data Fetcher")
+    print("=" * 50)
+    
+    outputs = outputs or OutputOptions()
+    
+    # Create data directories
+    create_data_directories()
+    
+    # Size the shared connection pool for the detailed review workers
+    configure_http_session(max_workers)
+    configure_rate_limiter(rate, burst)
+    configure_retry_policy(max_attempts)
+    
+    # Create timestamp for filenames
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    # Every output is fed from one pass over the streamed professor list;
+    # timestamped files go to the tracking folder first (safe approach)
+    detailed_sink = DetailedReviewsSink(
+        outputs.tracking_csv('professor_detailed_reviews', timestamp),
+        max_workers=max_workers,
+        batch_size=batch_size,
+        incremental=incremental,
+        checkpoint_filename=DEFAULT_CHECKPOINT_FILENAME if resume else None,
+        max_failures=max_failures,
+        review_outputs=review_outputs_for_run(timestamp, outputs),
+        sort_rows=outputs.sort_rows
+    )
+    all_sinks = tracking_sinks(timestamp, outputs) + [detailed_sink]
+    sinks = list(all_sinks)
+    
+    # Fetch data; a failure part-way through the stream discards every sink
+    count = 0
+    try:
+        try:
+            print("🔄 Fetching professor data from API...")
+            print("\n📁 Saving timestamped files to data/tracking/...")
+            count, sample = feed_sinks(iter_professor_data(), sinks)
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Error fetching data: {e}")
+        except JSON_ERRORS as e:
+            print(f"❌ Error parsing JSON: {e}")
+        except BaseException:
+            for sink in all_sinks:
+                sink.abort()
+            raise
+        
+        if count:
+            print(f"✅ Successfully fetched {count} professors")
+            success = close_sinks(sinks) and len(sinks) == len(all_sinks)
+            update_main_files(sample, main_file_pairs(timestamp, outputs), success, timestamp, outputs)
+        
+        else:
+            for sink in all_sinks:
+                sink.abort()
+            print("❌ Failed to fetch professor data")
+    finally:
+        close_http_session()
+
+async def main_async(concurrency=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE, incremental=False, resume=True, rate=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_BURST, max_attempts=DEFAULT_MAX_ATTEMPTS, max_failures=DEFAULT_ERROR_BUDGET, outputs=None):
+    """Async entry point: fetch everything on a single event loop instead of worker threads"""
+    if httpx is None:
+        print("❌ The async engine requires httpx (pip install httpx)")
+        return
+    
+    print("🚀 PolyRatings Professor Data Fetcher (async)")
+    print("=" * 50)
+    
+    outputs = outputs or OutputOptions()
+    
+    # Create data directories
+    create_data_directories()
+    
+    configure_rate_limiter(rate, burst)
+    configure_retry_policy(max_attempts)
+    
+    async with create_async_client(concurrency) as client:
+        # Fetch data
+        professors = await fetch_professor_data_async(client)
+        
+        if not professors:
+            print("❌ Failed to fetch professor data")
+            return
+        
+        # Create timestamp for filenames
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        
+        # Save timestamped files to tracking folder first (safe approach)
+        tracking_success = save_tracking_files(professors, timestamp, outputs)
+        
+        # Review outputs expect the same normalized records the sync pipeline passes on
+        records = [normalize_professor(prof) for prof in professors]
+        
+        # Fetch and save detailed professor reviews to tracking
+        print("\n📁 Fetching detailed professor reviews...")
+        detailed_success = await save_detailed_professor_reviews_async(
+            records,
+            client,
+            main_filename=None,  # Don't update main yet
+            tracking_filename=outputs.tracking_csv('professor_detailed_reviews', timestamp),
+            concurrency=concurrency,
+            batch_size=batch_size,
+            incremental=incremental,
+            checkpoint_filename=DEFAULT_CHECKPOINT_FILENAME if resume else None,
+            max_failures=max_failures,
+            review_outputs=review_outputs_for_run(timestamp, outputs),
+            sort_rows=outputs.sort_rows
+        )
+    
+    update_main_files(professors, main_file_pairs(timestamp, outputs), tracking_success and detailed_success, timestamp, outputs)
+
+# Query subcommand: answers from the indexed SQLite store built from data/main
+DEFAULT_QUERY_STORE = "data/main/polyratings.db"
+QUERY_SOURCE_FILES = ["data/main/professors_data.csv", "data/main/professor_detailed_reviews.csv"]
+
+def open_query_store(db_filename=DEFAULT_QUERY_STORE):
+    """Open the SQLite store read-only, (re)building it first if data/main is newer"""
+    newest_source = max((os.path.getmtime(part) for f in QUERY_SOURCE_FILES for part in _main_csv_files(f)), default=0)
+    if not os.path.exists(db_filename) or os.path.getmtime(db_filename) < newest_source:
+        print(f"🔄 Building {db_filename} from data/main...", file=sys.stderr)
+        # Keep build progress off stdout, which carries the query results
+        with contextlib.redirect_stdout(sys.stderr):
+            build_sqlite_store(db_filename, *QUERY_SOURCE_FILES)
+    conn = sqlite3.connect(f"file:{db_filename}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def resolve_professor_id(conn, professor):
+    """Resolve a professor ID or name to (professor_id, candidates)
+    
+    Only an ID, a single exact name match (incl. nicknames) or a single
+    prefix match is accepted. Otherwise professor_id is None and candidates
+    lists the professors the name might have meant, fuzzy matches included,
+    so a near miss is never silently swapped for someone else.
+    """
+    if conn.execute("SELECT 1 FROM professors WHERE id = ?", (professor,)).fetchone():
+        return professor, []
+    index_filename = "data/main/professor_name_to_id.idx"
+    if os.path.exists(index_filename):
+        with NameIndex(index_filename) as names:
+            matches = names.exact(professor) or names.prefix(professor, limit=10)
+            if len(matches) == 1:
+                return matches[0]['id'], matches
+            return None, matches or names.fuzzy(professor, limit=10)
+    rows = conn.execute("SELECT id, fullName FROM professors WHERE fullName = ? COLLATE NOCASE", (professor,)).fetchall()
+    candidates = [{'id': row['id'], 'name': row['fullName'], 'match': 'exact', 'score': 1.0} for row in rows]
+    if len(candidates) == 1:
+        return candidates[0]['id'], candidates
+    return None, candidates
+
+def _date_bound(value, end=False):
+    """Date or timestamp bound comparable with ISO post_date strings; a bare end date covers the whole day"""
+    if value and end and len(value) == 10:
+        return f"{value}T23:59:59.999Z"
+    return value
+
+def query_reviews(conn, professor_id=None, course_code=None, department=None, since=None, until=None, limit=None):
+    """Stream review rows (CSV columns) filtered by professor, course, department and date range
+    
+    Each filter maps onto an index of the store (reviews by professor,
+    by course and date, by date; professors by department).
+    """
+    sql = "SELECT r.* FROM professor_detailed_reviews r"
+    conditions, params = [], []
+    if department:
+        conditions.append("r.professor_department = ?")
+        params.append(department)
+    if professor_id:
+        conditions.append("r.professor_id = ?")
+        params.append(professor_id)
+    if course_code:
+        conditions.append("r.course_code = ?")
+        params.append(course_code)
+    if since:
+        conditions.append("r.post_date >= ?")
+        params.append(_date_bound(since))
+    if until:
+        conditions.append("r.post_date <= ?")
+        params.append(_date_bound(until, end=True))
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY r.post_date, r.review_id"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    for row in conn.execute(sql, params):
+        yield dict(row)
+
+def top_professors(conn, limit=10, min_evals=10, department=None):
+    """Highest-rated professors with at least min_evals evaluations"""
+    sql = "SELECT id, fullName, department, overallRating, numEvals FROM professors WHERE numEvals >= ?"
+    params = [min_evals]
+    if department:
+        sql += " AND department = ?"
+        params.append(department)
+    sql += " ORDER BY overallRating DESC, numEvals DESC, id LIMIT ?"
+    params.append(limit)
+    for row in conn.execute(sql, params):
+        yield dict(row)
+
+def _write_results(rows, output_format):
+    """Write result dicts to stdout as CSV or JSON lines, one at a time"""
+    writer = None
+    count = 0
+    for row in rows:
+        if output_format == 'jsonl':
+            sys.stdout.write(json.dumps(row, ensure_ascii=False) + '\n')
+        else:
+            if writer is None:
+                writer = csv.DictWriter(sys.stdout, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+        count += 1
+    return count
+
+def run_query(args):
+    """Entry point of the query subcommand"""
+    if args.query == 'search':
+        if not os.path.exists(args.index):
+            print(f"🔄 Building {args.index} from data/main...", file=sys.stderr)
+            update_search_index(args.index)
+        rows = search_reviews(' '.join(args.text), args.index, limit=args.limit, professor_id=args.professor, course_code=args.course)
+        count = _write_results(rows, args.format)
+    else:
+        conn = open_query_store(args.db)
+        try:
+            if args.query == 'reviews':
+                professor_id = None
+                if args.professor:
+                    professor_id, candidates = resolve_professor_id(conn, args.professor)
+                    if professor_id is None:
+                        if not candidates:
+                            print(f"❌ No professor matches {args.professor!r}", file=sys.stderr)
+                        else:
+                            print(f"❌ {args.professor!r} does not match exactly one professor, did you mean:", file=sys.stderr)
+                            for candidate in candidates:
+                                print(f"   • {candidate['name']} ({candidate['id']})", file=sys.stderr)
+                        return False
+                rows = query_reviews(conn, professor_id, args.course, args.department, args.since, args.until, args.limit)
+            else:
+                rows = top_professors(conn, args.limit, args.min_evals, args.department)
+            count = _write_results(rows, args.format)
+        finally:
+            conn.close()
+    print(f"📊 {count} rows", file=sys.stderr)
+    return True
+
+def add_query_arguments(subparsers):
+    """Register the query subcommand and its reviews/top/search queries"""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--db', default=DEFAULT_QUERY_STORE,
+                        help=f"SQLite store to query, rebuilt when data/main is newer (default: {DEFAULT_QUERY_STORE})")
+    common.add_argument('--format', choices=['csv', 'jsonl'], default='csv', help="output format (default: csv)")
+    
+    query_parser = subparsers.add_parser('query', help="answer questions from the indexed store built from data/main")
+    queries = query_parser.add_subparsers(dest='query', required=True)
+    
+    reviews_parser = queries.add_parser('reviews', parents=[common], help="reviews for a professor, course or department in a date range")
+    reviews_parser.add_argument('--professor', help="professor ID or name")
+    reviews_parser.add_argument('--course', help="course code, e.g. 'CSC 101'")
+    reviews_parser.add_argument('--department', help="department code, e.g. CSC")
+    reviews_parser.add_argument('--since', help="first post date (YYYY-MM-DD)")
+    reviews_parser.add_argument('--until', help="last post date (YYYY-MM-DD)")
+    reviews_parser.add_argument('--limit', type=int, help="maximum rows")
+    
+    top_parser = queries.add_parser('top', parents=[common], help="top-N professors by rating")
+    top_parser.add_argument('--limit', type=int, default=10, help="number of professors (default: 10)")
+    top_parser.add_argument('--min-evals', type=int, default=10, help="minimum evaluations (default: 10)")
+    top_parser.add_argument('--department', help="department code, e.g. CSC")
+    
+    search_parser = queries.add_parser('search', parents=[common], help="full-text search of review text")
+    search_parser.add_argument('text', nargs='+', help="words to search for")
+    search_parser.add_argument('--index', default=DEFAULT_SEARCH_INDEX_FILENAME, help="full-text index file")
+    search_parser.add_argument('--professor', help="professor ID")
+    search_parser.add_argument('--course', help="course code")
+    search_parser.add_argument('--limit', type=int, default=20, help="maximum hits (default: 20)")
+
+# Local read-only HTTP API over data/main
+SERVE_FILES = {
+    'professors': "data/main/professors_data.csv",
+    'reviews': "data/main/professor_detailed_reviews.csv",
+    'departments': "data/main/department_summary.csv",
+    'names': "data/main/professor_name_to_id.idx"
+}
+SERVE_RELOAD_INTERVAL = 2.0
+
+def _data_signature(files):
+    """(mtime, size, inode) of each data file; changes whenever a file is promoted"""
+    signature = []
+    for filename in [part for f in files for part in _main_csv_files(f) or [f]]:
+        try:
+            stat = os.stat(filename)
+            signature.append((filename, stat.st_mtime_ns, stat.st_size, stat.st_ino))
+        except OSError:
+            signature.append((filename, None))
+    return tuple(signature)
+
+class DataSnapshot:
+    """One immutable, indexed load of the data/main files served by the HTTP API"""
+    
+    def __init__(self, files=None):
+        self.files = dict(SERVE_FILES, **(files or {}))
+        self.signature = _data_signature(self.files.values())
+        self.etag = hashlib.sha1(repr(self.signature).encode('utf-8')).hexdigest()[:16]
+        mtimes = [os.path.getmtime(part) for f in self.files.values() for part in _main_csv_files(f)]
+        self.last_modified = email.utils.formatdate(max(mtimes, default=time.time()), usegmt=True)
+        
+        self.professors = {}
+        self.names = {}
+        for row in _read_csv_rows(self.files['professors']):
+            record = _professor_record_from_csv(row)
+            self.professors[record['id']] = record
+            self.names.setdefault(normalize_name(record['fullName']), []).append(record['id'])
+        
+        self.reviews_by_professor = {}
+        self.reviews_by_course = {}
+        for row in _read_main_csv_rows(self.files['reviews']):
+            row = Review.from_mapping(row)
+            for column in PARQUET_FLOAT_COLUMNS:
+                row[column] = float(row[column]) if row[column] else None
+            self.reviews_by_professor.setdefault(row['professor_id'], []).append(row)
+            self.reviews_by_course.setdefault(row['course_code'].upper(), []).append(row)
+        
+        self.departments = {}
+        if os.path.exists(self.files['departments']):
+            for row in _read_csv_rows(self.files['departments']):
+                row['professor_ids'] = [i for i in row['professor_ids'].split('; ') if i]
+                for column, value in row.items():
+                    if column in ('professor_count', 'total_evals'):
+                        row[column] = int(value)
+                    elif column not in ('department', 'professor_ids'):
+                        row[column] = float(value) if value else None
+                self.departments[row['department'].upper()] = row
+    
+    def find_professors(self, name, limit=10):
+        """Professors matching a name, through the name index when there is one"""
+        if os.path.exists(self.files['names']):
+            with NameIndex(self.files['names']) as names:
+                matches = names.lookup(name, limit)
+            return [dict(self.professors[m['id']], match=m['match'], score=m['score']) for m in matches if m['id'] in self.professors]
+        return [self.professors[i] for i in self.names.get(normalize_name(name), [])][:limit]
+
+class DataServer(http.server.ThreadingHTTPServer):
+    """HTTP server holding the current DataSnapshot, swapped in when data/main changes"""
+    
+    daemon_threads = True
+    
+    def __init__(self, address, files=None, reload_interval=SERVE_RELOAD_INTERVAL):
+        self.files = files
+        self.snapshot = DataSnapshot(files)
+        self._stop_reloading = threading.Event()
+        super().__init__(address, DataRequestHandler)
+        if reload_interval:
+            threading.Thread(target=self._watch, args=(reload_interval,), daemon=True).start()
+    
+    def _watch(self, interval):
+        while not self._stop_reloading.wait(interval):
+            if _data_signature(self.snapshot.files.values()) == self.snapshot.signature:
+                continue
+            try:
+                # Build the new snapshot fully before swapping, so requests never see a partial load
+                self.snapshot = DataSnapshot(self.files)
+                print(f"🔄 Reloaded data (etag {self.snapshot.etag})")
+            except Exception as e:
+                print(f"⚠️  Reload failed, still serving the previous data: {e}")
+    
+    def server_close(self):
+        self._stop_reloading.set()
+        super().server_close()
+
+class DataRequestHandler(http.server.BaseHTTPRequestHandler):
+    """JSON endpoints over a DataSnapshot
+    
+    GET /professors/<id>, /professors?name=<name>, /professors/<id>/reviews,
+    /courses/<code>/reviews, /departments, /departments/<code>, /health.
+    Responses carry ETag and Last-Modified and honour conditional requests.
+    """
+    
+    server_version = "PolyRatingsData/1.0"
+    
+    def do_GET(self):
+        snapshot = self.server.snapshot
+        url = urllib.parse.urlsplit(self.path)
+        parts = [urllib.parse.unquote(part) for part in url.path.split('/') if part]
+        params = urllib.parse.parse_qs(url.query)
+        raw_limit = params.get('limit', ['0'])[0] or '0'
+        try:
+            limit = int(raw_limit)
+        except ValueError:
+            limit = -1
+        if limit < 0:
+            return self._send_json(400, {'error': f"limit must be a non-negative integer, got {raw_limit!r}"})
+        
+        if parts == ['health']:
+            return self._send_json(200, {'status': 'ok', 'professors': len(snapshot.professors), 'etag': snapshot.etag}, snapshot)
+        if parts == ['professors'] and 'name' in params:
+            return self._send_json(200, snapshot.find_professors(params['name'][0], limit or 10), snapshot)
+        if len(parts) == 2 and parts[0] == 'professors':
+            professor = snapshot.professors.get(parts[1])
+            if professor is None:
+                return self._send_json(404, {'error': f"Unknown professor {parts[1]}"})
+            return self._send_json(200, professor, snapshot)
+        if len(parts) == 3 and parts[0] == 'professors' and parts[2] == 'reviews':
+            if parts[1] not in snapshot.professors:
+                return self._send_json(404, {'error': f"Unknown professor {parts[1]}"})
+            return self._send_json(200, self._limited(snapshot.reviews_by_professor.get(parts[1], []), limit), snapshot)
+        if len(parts) == 3 and parts[0] == 'courses' and parts[2] == 'reviews':
+            reviews = snapshot.reviews_by_course.get(parts[1].upper())
+            if reviews is None:
+                return self._send_json(404, {'error': f"Unknown course {parts[1]}"})
+            return self._send_json(200, self._limited(reviews, limit), snapshot)
+        if parts == ['departments']:
+            return self._send_json(200, list(snapshot.departments.values()), snapshot)
+        if len(parts) == 2 and parts[0] == 'departments':
+            department = snapshot.departments.get(parts[1].upper())
+            if department is None:
+                return self._send_json(404, {'error': f"Unknown department {parts[1]}"})
+            return self._send_json(200, department, snapshot)
+        return self._send_json(404, {'error': f"No endpoint {url.path}"})
+    
+    @staticmethod
+    def _limited(rows, limit):
+        return rows[:limit] if limit else rows
+    
+    def _not_modified(self, etag, snapshot):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return email.utils.parsedate_to_datetime(if_modified_since) >= email.utils.parsedate_to_datetime(snapshot.last_modified)
+            except (TypeError, ValueError):
+                return False
+        return False
+    
+    def _send_json(self, status, payload, snapshot=None):
+        headers = {'Content-Type': 'application/json; charset=utf-8'}
+        if snapshot is not None:
+            # One ETag per data version and URL, so any promotion invalidates every cached response
+            etag = f'"{snapshot.etag}-{hashlib.sha1(self.path.encode("utf-8")).hexdigest()[:8]}"'
+            headers.update({'ETag': etag, 'Last-Modified': snapshot.last_modified, 'Cache-Control': 'no-cache'})
+            if self._not_modified(etag, snapshot):
+                status, payload = 304, None
+        
+        body = b'' if payload is None else json.dumps(payload, ensure_ascii=False, default=dict).encode('utf-8')
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+def serve(host='127.0.0.1', port=8000, reload_interval=SERVE_RELOAD_INTERVAL):
+    """Serve data/main as a read-only JSON API until interrupted"""
+    print("🚀 Loading data/main...")
+    server = DataServer((host, port), reload_interval=reload_interval)
+    print(f"✅ Serving {len(server.snapshot.professors)} professors on http://{host}:{port} (reloads when data/main changes)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Fetch PolyRatings professor data and reviews (or query/serve them)")
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"number of concurrent detailed review requests (default: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="professors fetched per tRPC batch request (default: 1, no batching)")
+    parser.add_argument('--rate', type=float, default=DEFAULT_REQUESTS_PER_SECOND,
+                        help=f"maximum API requests per second (default: {DEFAULT_REQUESTS_PER_SECOND:g})")
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST,
+                        help=f"requests allowed back-to-back before the rate limit applies (default: {DEFAULT_BURST})")
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help=f"attempts per request before giving up on transient errors (default: {DEFAULT_MAX_ATTEMPTS})")
+    parser.add_argument('--error-budget', type=int, default=DEFAULT_ERROR_BUDGET,
+                        help=f"professors allowed to fail before the run is aborted (default: {DEFAULT_ERROR_BUDGET})")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only fetch reviews for professors that are new or changed since data/main")
+    parser.add_argument('--no-resume', dest='resume', action='store_false',
+                        help="ignore any checkpoint left by an interrupted run and don't write a new one")
+    parser.add_argument('--parquet', action='store_true',
+                        help="also write the detailed reviews as Parquet (needs pyarrow)")
+    parser.add_argument('--sqlite', action='store_true',
+                        help="also build an indexed SQLite store (data/main/polyratings.db)")
+    parser.add_argument('--compress-tracking', choices=['none', 'gzip', 'zstd', 'auto'], default='none',
+                        help="compress the timestamped tracking CSVs ('auto': zstd if installed, else gzip)")
+    parser.add_argument('--search-index', action='store_true',
+                        help=f"update the full-text review index in {DEFAULT_SEARCH_INDEX_FILENAME} after promoting")
+    parser.add_argument('--sort', dest='sort_rows', action='store_true',
+                        help="write every CSV in canonical order (professors by ID, departments by name, reviews by professor/course/date/review ID)")
+    parser.add_argument('--shard-reviews', action='store_true',
+                        help="store the detailed reviews in data/main as one sorted CSV per department (reviews_by_department/) instead of one CSV")
+    parser.add_argument('--snapshot-mode', choices=['full', 'delta'], default='full',
+                        help="keep full tracking copies of reviews/professors, or a base plus per-run deltas in data/tracking/snapshots")
+    parser.add_argument('--engine', choices=['threads', 'async'], default='threads',
+                        help="run requests on a thread pool or a single asyncio event loop (needs httpx)")
+    subparsers = parser.add_subparsers(dest='command')
+    add_query_arguments(subparsers)
+    serve_parser = subparsers.add_parser('serve', help="serve data/main as a local read-only JSON API")
+    serve_parser.add_argument('--host', default='127.0.0.1', help="address to bind (default: 127.0.0.1)")
+    serve_parser.add_argument('--port', type=int, default=8000, help="port to listen on (default: 8000)")
+    serve_parser.add_argument('--reload-interval', type=float, default=SERVE_RELOAD_INTERVAL,
+                              help=f"seconds between checks for promoted files, 0 to disable (default: {SERVE_RELOAD_INTERVAL:g})")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == 'query':
+        sys.exit(0 if run_query(args) else 1)
+    if args.command == 'serve':
+        serve(args.host, args.port, args.reload_interval)
+        sys.exit(0)
+    
+    options = dict(
+        batch_size=args.batch_size,
+        incremental=args.incremental,
+        resume=args.resume,
+        rate=args.rate,
+        burst=args.burst,
+        max_attempts=args.max_attempts,
+        max_failures=args.error_budget,
+        outputs=OutputOptions(
+            parquet=args.parquet,
+            sqlite=args.sqlite,
+            compression=args.compress_tracking,
+            snapshot_mode=args.snapshot_mode,
+            shard_reviews=args.shard_reviews,
+            sort_rows=args.sort_rows,
+            search_index=args.search_index
+        )
+    )
+    if args.engine == 'async':
+        asyncio.run(main_async(concurrency=args.workers, **options))
+    else:
+        main(max_workers=args.workers, **options)